@@ -1,7 +1,5 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_restx import Api
-#from .models.api_models import create_api_models
 from config import Config
 
 
@@ -9,31 +7,80 @@ from config import Config
 db = SQLAlchemy()
 
 
-# Create a function to initialize your Flask app
+# The one app factory, used by run.py, worker.py, the CLI and the benchmarks. The API
+# (and its Swagger docs at /) lives on the blueprint in api_endpoints/routes.py.
+# Everything is imported inside the factory, and praw only when the first Reddit
+# client is built, to keep worker boots short.
 def create_app(config_class=Config):
     app = Flask(__name__)
     # Load configurations from the 'config.py' file
-    app.config.from_object(Config)
-
-    # Initialize Flask-RESTx Api
-    api = Api(
-        app,
-        version="1.0",
-        title="Reddit API",
-        description="API for extracting subreddit data"
-    )
-
-     # Initialize API models
-    #create_api_models(api)
+    app.config.from_object(config_class)
 
     #initialise the database
+    from .storage import configure_storage
+    configure_storage(app)
     db.init_app(app)
 
-    #build the tables
+    # size the in-process keyword result caches
+    from .services.cache import keyword_cache, response_cache
+    keyword_cache.maxsize = app.config["KEYWORD_CACHE_SIZE"]
+    response_cache.maxsize = app.config["RESPONSE_CACHE_SIZE"]
+
+    # Reddit client pool, one client per credential set
+    from .services.reddit_clients import reddit_clients
+    reddit_clients.configure(
+        app.config["REDDIT_CREDENTIALS"] or [{
+            "client_id": app.config["REDDIT_ID"],
+            "client_secret": app.config["REDDIT_SECRET"],
+            "user_agent": app.config["REDDIT_USER_AGENT"],
+        }],
+        app.config["REDDIT_RATE_LIMIT"],
+        app.config["REDDIT_RATE_BURST"],
+        app.config["REDDIT_WINDOW_QUOTA"],
+    )
+
+    # state shared by every worker process (pooled credentials, cache invalidation, fetch
+    # leases), polled for changes before requests
+    from .services import shared_state
+    from .services.cache import clear_caches
+    shared_state.configure(app)
+    shared_state.watch(shared_state.CREDENTIALS_KEY, reddit_clients.set_credentials)
+    shared_state.watch(shared_state.CACHE_GENERATION_KEY, clear_caches)
+
+    #build the tables, or bring an older database file up to the current schema, unless
+    # schema_version says it already is (the models must be imported first so their
+    # tables are registered on db.metadata)
     with app.app_context():
-        db.create_all()
+        from .models import db_models  # noqa: F401
+        from .storage import ensure_schema
+        ensure_schema()
+
+        # route praw/prawcore logs to the queued PRAWLogData writer
+        from .utils import configure_praw_logging
+        configure_praw_logging()
 
     from .api_endpoints.routes import api_blueprint
     app.register_blueprint(api_blueprint)
 
+    # request timing and the optional per-request profiler
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    from .cli import (
+        copy_db_command,
+        export_command,
+        import_keywords_command,
+        ingest_comments_command,
+        maintenance_command,
+        rebuild_stats_command,
+        upgrade_db_command,
+    )
+    app.cli.add_command(export_command)
+    app.cli.add_command(import_keywords_command)
+    app.cli.add_command(ingest_comments_command)
+    app.cli.add_command(maintenance_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(copy_db_command)
+
     return app
\ No newline at end of file
@@ -1,72 +1,322 @@
-from flask import Blueprint, request, current_app
-from flask_restx import Api, Resource, reqparse
-from app import api
+from datetime import timezone
+from flask import Blueprint, Response, g, request, current_app, stream_with_context
+from flask_restx import Api, Resource, inputs, reqparse
+from flask_restx.representations import output_json
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import FileStorage
+from app import db
+from app.metrics import SERIALIZE_SECONDS, current_endpoint, registry, timer
 from app.models.api_models import create_api_models
-from app.models.db_models import PRAWLogData
+from app.models.db_models import KeywordData
+from app.serialization import conditional_json_response, dumps, json_response, row_serializer
+from app.services.cache import response_cache
 #from app.models.api_models import credential_model, subreddit_model, keyword_model, praw_log_model
+from app.services.export_services import EXPORT_FORMATS, stream_export
+from app.services.import_services import IMPORT_FORMATS, import_keywords, parse_keyword_file
+from app.services.log_services import get_praw_logs_page, iter_praw_logs
+from app.services import shared_state
+from app.services.reddit_clients import reddit_clients
+from app.services.rollup_services import ROLLUP_DIMENSIONS, get_daily_stats
+from app.services.search_services import search_posts
 from app.services.keyword_services import (
     add_keyword_data,
+    get_keyword_version,
+    get_or_create_keyword_data,
     get_subreddit_data_by_keyword,
-    fetch_and_store_reddit_data
+    fetch_cold_keyword,
+    fetch_keywords_batch,
+    record_keyword_request
 )
 
 api_blueprint = Blueprint('endpoint', __name__)
 endpoint = Api(api_blueprint, title='Reddit API', description='API for extracting subreddit data')
 
-api_models = create_api_models(api)
+api_models = create_api_models(endpoint)
+
+# list endpoints serialize column rows directly (see app/serialization.py)
+subreddit_rows = row_serializer(api_models["subreddit_model"])
+praw_log_rows = row_serializer(api_models["praw_log_model"])
+search_result_rows = row_serializer(api_models["search_result_model"])
+daily_stats_rows = row_serializer(api_models["daily_stats_model"])
+
+
+def utc_datetime(value):
+    # ISO 8601 time as naive UTC, the way timestamps are stored; an offset such as
+    # +02:00 or Z is converted rather than dropped
+    value = inputs.datetime_from_iso8601(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+utc_datetime.__schema__ = inputs.datetime_from_iso8601.__schema__
+
+
+@endpoint.representation("application/json")
+def timed_output_json(data, code, headers=None):
+    with timer(SERIALIZE_SECONDS, endpoint=current_endpoint(), stage="encode"):
+        return output_json(data, code, headers)
+
+
+# Prometheus scrape endpoint
+@api_blueprint.route("/metrics")
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
 
 @endpoint.route("/reddit_credentials")
 class RedditCredentials(Resource):
+    @endpoint.marshal_list_with(api_models["client_status_model"])
+    def get(self):
+        # Quota state of each pooled client; secrets are never returned
+        return reddit_clients.status()
+
     @endpoint.expect(api_models["credential_model"])
     def post(self):
-        global reddit
-        credentials = request.json
-        current_app.config["REDDIT_ID"] = credentials["client_id"]
-        current_app.config["REDDIT_SECRET"] = credentials["client_secret"]
-        current_app.config["REDDIT_USER_AGENT"] = credentials["user_agent"]
+        # A single credential set, or {"credentials": [...]} to pool several. Replaces the
+        # pool in one swap; fetches already running finish on their current client. The
+        # other worker processes pick the new set up from the shared state backend.
+        data = request.json or {}
+        credentials = data["credentials"] if "credentials" in data else [data]
+        for item in credentials:
+            missing = [name for name in ("client_id", "client_secret", "user_agent") if not item.get(name)]
+            if missing:
+                endpoint.abort(400, "Missing %s in credentials" % ", ".join(missing))
+        credentials = [
+            {name: item[name] for name in ("client_id", "client_secret", "user_agent")} for item in credentials
+        ]
+        reddit_clients.set_credentials(credentials)
+        shared_state.publish(shared_state.CREDENTIALS_KEY, credentials)
 
-        # Reset the Reddit client
-        reddit = None
-
-        return {"message": "Credentials updated successfully"}, 200
+        return {"message": "Credentials updated successfully", "clients": len(credentials)}, 200
 
 
 # REST API endpoint for PRAW logs
+praw_logs_parser = reqparse.RequestParser()
+praw_logs_parser.add_argument("limit", type=inputs.int_range(1, 1000), default=100, help="Page size (max 1000)")
+praw_logs_parser.add_argument("cursor", type=str, help="Opaque cursor from the X-Next-Cursor header of the previous page")
+praw_logs_parser.add_argument("since", type=utc_datetime, help="Only logs at or after this ISO 8601 time")
+praw_logs_parser.add_argument("until", type=utc_datetime, help="Only logs before this ISO 8601 time")
+praw_logs_parser.add_argument("level", type=str, help="Log level, e.g. DEBUG or WARNING")
+praw_logs_parser.add_argument("format", type=str, choices=("json", "ndjson"), default="json",
+                              help="json for one page, ndjson to stream every matching row")
+
+
 @endpoint.route("/praw_logs")
 class PRAWLogsResource(Resource):
-    @endpoint.marshal_list_with(api_models["praw_log_model"])
+    @endpoint.expect(praw_logs_parser)
+    @endpoint.response(200, "Success", [api_models["praw_log_model"]])
     def get(self):
-        # Get PRAW logs from the database
-        praw_logs = PRAWLogData.query.all()
+        args = praw_logs_parser.parse_args()
+        filters = {
+            "since": args["since"],
+            "until": args["until"],
+            "level": args["level"],
+            "cursor": args["cursor"],
+        }
+        try:
+            if args["format"] == "ndjson":
+                rows = iter_praw_logs(**filters)
+                return Response(stream_with_context(_ndjson_lines(rows)), mimetype="application/x-ndjson")
+
+            # Get one page of PRAW logs, newest first
+            praw_logs, next_cursor = get_praw_logs_page(args["limit"], **filters)
+        except ValueError as exc:
+            endpoint.abort(400, str(exc))
+
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return json_response(praw_log_rows(praw_logs), 200, headers)
+
 
-        print(
-            "Number of logs retrieved:", len(praw_logs)
-        )  # Add this line for debugging
+def _ndjson_lines(rows):
+    for row in rows:
+        yield dumps(dict(row._mapping)) + b"\n"
+
+
+keyword_data_parser = reqparse.RequestParser()
+keyword_data_parser.add_argument("keyword", type=str, required=True, help="Keyword to match on subreddits")
+keyword_data_parser.add_argument("account_name", type=str, help="The account, required the first time a keyword is seen")
+keyword_data_parser.add_argument("industry", type=str, help="The industry of the account, required the first time a keyword is seen")
 
-        return praw_logs
-    
 
 @endpoint.route("/keyword_data")
 class KeywordDataResource(Resource):
-    @endpoint.expect(reqparse.RequestParser().add_argument("keyword", type=str, required=True, help="Keyword to match on subreddits"))
-    @endpoint.marshal_with(api_models["subreddit_model"], as_list=True)
+    @endpoint.expect(keyword_data_parser)
+    @endpoint.response(200, "Success", [api_models["subreddit_model"]])
+    @endpoint.response(304, "Not modified since the ETag in If-None-Match")
     def get(self):
-        parser = reqparse.RequestParser()
-        parser.add_argument("keyword", type=str, required=True, help="Keyword to match on subreddits")
-        args = parser.parse_args()
+        args = keyword_data_parser.parse_args()
         keyword = args['keyword']
+        record_keyword_request(keyword)
+
+        # Conditional GET: the ETag comes from keyword_data alone, so unchanged polls get a
+        # 304 without loading posts, and changed ones reuse the encoded body when cached
+        version = get_keyword_version(keyword)
+        if version is not None:
+            # labelled only once the keyword is known to exist, so arbitrary query strings
+            # cannot create new keyword_request_duration_seconds series
+            g.metrics_keyword = keyword
+            data_version = version.data_version or 0
+            return conditional_json_response(
+                response_cache,
+                keyword,
+                "%d.%d" % (version.id, data_version),
+                version.data_modified or version.last_fetched,
+                lambda: subreddit_rows(get_subreddit_data_by_keyword(keyword, data_version)),
+            )
 
-        subreddit_data_list = get_subreddit_data_by_keyword(keyword)
-        if subreddit_data_list is not None:
-            return subreddit_data_list
+        if not (args["account_name"] and args["industry"]) and not KeywordData.query.filter_by(keyword=keyword).first():
+            endpoint.abort(400, 'Missing or invalid "account_name" or "industry" parameters. Provide both.')
 
-        keyword_data = add_keyword_data(keyword)
-        return fetch_and_store_reddit_data(keyword, keyword_data.id)
+        if current_app.config["INGESTION_MODE"] == "worker":
+            # registered for the ingestion worker, which fetches new keywords first
+            get_or_create_keyword_data(keyword, args["account_name"], args["industry"])
+            g.metrics_keyword = keyword
+            return [], 202
+        rows = fetch_cold_keyword(keyword, args["account_name"], args["industry"])
+        g.metrics_keyword = keyword
+        return json_response(subreddit_rows(rows))
 
     @endpoint.expect(api_models["keyword_model"])
     @endpoint.marshal_with(api_models["keyword_model"])
     def post(self):
         data = request.json
-        keyword_data = add_keyword_data(data["keyword"], data.get("account_name"), data.get("industry"))
+        try:
+            keyword_data = add_keyword_data(data["keyword"], data.get("account_name"), data.get("industry"))
+        except IntegrityError:
+            db.session.rollback()
+            endpoint.abort(409, "Keyword %r is already registered" % data["keyword"])
         return keyword_data, 201
 
+
+@endpoint.route("/keyword_data/batch")
+class KeywordDataBatchResource(Resource):
+    @endpoint.expect(api_models["keyword_batch_model"])
+    @endpoint.marshal_list_with(api_models["keyword_status_model"])
+    def post(self):
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            endpoint.abort(400, 'Expected a JSON object with a "keywords" list')
+        keywords = data.get("keywords")
+        if not keywords:
+            endpoint.abort(400, 'Missing or empty "keywords" list')
+        if not isinstance(keywords, list) or not all(isinstance(keyword, str) for keyword in keywords):
+            endpoint.abort(400, '"keywords" must be a list of strings')
+        if len(keywords) > current_app.config["BATCH_MAX_KEYWORDS"]:
+            endpoint.abort(400, "Too many keywords, maximum is %d" % current_app.config["BATCH_MAX_KEYWORDS"])
+        for name in ("account_name", "industry"):
+            if not isinstance(data.get(name), (str, type(None))):
+                endpoint.abort(400, '"%s" must be a string' % name)
+
+        return fetch_keywords_batch(keywords, data.get("account_name"), data.get("industry"))
+
+
+# Bulk keyword registration from a JSON or CSV upload
+keyword_import_parser = reqparse.RequestParser()
+keyword_import_parser.add_argument("file", type=FileStorage, location="files",
+                                   help="JSON or CSV file; alternatively send it as the request body")
+keyword_import_parser.add_argument("format", type=str, choices=IMPORT_FORMATS, location="args",
+                                   help="json or csv (default: from the file name or Content-Type)")
+keyword_import_parser.add_argument("account_name", type=str, location="args", help="For rows without their own")
+keyword_import_parser.add_argument("industry", type=str, location="args", help="For rows without their own")
+keyword_import_parser.add_argument("dry_run", type=inputs.boolean, default=False, location="args",
+                                   help="Only validate and report, write nothing")
+
+
+@endpoint.route("/keyword_data/import")
+class KeywordDataImportResource(Resource):
+    @endpoint.expect(keyword_import_parser)
+    @endpoint.response(200, "Success", api_models["keyword_import_model"])
+    def post(self):
+        args = keyword_import_parser.parse_args()
+        upload = args["file"]
+        if upload is not None:
+            data, filename, mimetype = upload.read(), upload.filename or "", upload.mimetype
+        else:
+            data, filename, mimetype = request.get_data(), "", request.mimetype
+        fmt = args["format"] or ("csv" if filename.lower().endswith(".csv") or mimetype == "text/csv" else "json")
+        try:
+            rows = parse_keyword_file(data, fmt, args["account_name"], args["industry"])
+        except ValueError as exc:
+            endpoint.abort(400, str(exc))
+        if len(rows) > current_app.config["KEYWORD_IMPORT_MAX_ROWS"]:
+            endpoint.abort(400, "Too many rows, maximum is %d" % current_app.config["KEYWORD_IMPORT_MAX_ROWS"])
+
+        return json_response(import_keywords(rows, current_app.config["KEYWORD_IMPORT_CHUNK_SIZE"], args["dry_run"]))
+
+
+# Streaming bulk export of stored posts
+export_parser = reqparse.RequestParser()
+export_parser.add_argument("format", type=str, choices=tuple(EXPORT_FORMATS), default="ndjson", help="ndjson, csv or parquet")
+export_parser.add_argument("compression", type=str, help="gzip for ndjson/csv; snappy, gzip, zstd, brotli, lz4 or none for parquet")
+export_parser.add_argument("keyword", type=str, help="Only posts stored for this keyword")
+export_parser.add_argument("industry", type=str, help="Only posts for keywords in this industry")
+export_parser.add_argument("account_name", type=str, help="Only posts for keywords of this account")
+export_parser.add_argument("subreddit", type=str, help="Only posts from this subreddit")
+export_parser.add_argument("since", type=utc_datetime, help="Only posts created at or after this ISO 8601 time")
+export_parser.add_argument("until", type=utc_datetime, help="Only posts created before this ISO 8601 time")
+
+
+@endpoint.route("/export")
+class ExportResource(Resource):
+    @endpoint.expect(export_parser)
+    @endpoint.produces(["application/x-ndjson", "text/csv", "application/vnd.apache.parquet", "application/gzip"])
+    def get(self):
+        args = export_parser.parse_args()
+        try:
+            blocks, mimetype, filename = stream_export(
+                args.pop("format"),
+                args.pop("compression"),
+                chunk_size=current_app.config["EXPORT_CHUNK_SIZE"],
+                **args
+            )
+        except ValueError as exc:
+            endpoint.abort(400, str(exc))
+
+        return Response(
+            stream_with_context(blocks),
+            mimetype=mimetype,
+            headers={"Content-Disposition": "attachment; filename=%s" % filename},
+        )
+
+
+# Ranked full-text search over stored post titles and bodies
+search_parser = reqparse.RequestParser()
+search_parser.add_argument("q", type=str, required=True, help="Words to search for in post titles and bodies")
+search_parser.add_argument("keyword", type=str, help="Only posts stored for this keyword")
+search_parser.add_argument("subreddit", type=str, help="Only posts from this subreddit")
+search_parser.add_argument("since", type=utc_datetime, help="Only posts created at or after this ISO 8601 time")
+search_parser.add_argument("until", type=utc_datetime, help="Only posts created before this ISO 8601 time")
+search_parser.add_argument("page", type=inputs.positive, default=1, help="Page number, starting at 1")
+search_parser.add_argument("per_page", type=inputs.int_range(1, 100), default=20, help="Results per page (max 100)")
+
+
+@endpoint.route("/search")
+class SearchResource(Resource):
+    @endpoint.expect(search_parser)
+    @endpoint.response(200, "Success", [api_models["search_result_model"]])
+    def get(self):
+        args = search_parser.parse_args()
+        if not args["q"].strip():
+            endpoint.abort(400, 'Missing or empty "q" parameter')
+        return json_response(search_result_rows(search_posts(args.pop("q"), **args)))
+
+
+# Per-day post counts from the materialized rollups (app/services/rollup_services.py)
+stats_parser = reqparse.RequestParser()
+stats_parser.add_argument("group", type=str, choices=ROLLUP_DIMENSIONS, default="subreddit",
+                          help="subreddit, industry or account_name")
+stats_parser.add_argument("value", type=str, help="Only this subreddit, industry or account name")
+stats_parser.add_argument("since", type=inputs.date_from_iso8601, help="Only days on or after this ISO 8601 date")
+stats_parser.add_argument("until", type=inputs.date_from_iso8601, help="Only days before this ISO 8601 date")
+stats_parser.add_argument("limit", type=inputs.int_range(1, 10000), default=1000, help="Maximum rows (max 10000)")
+
+
+@endpoint.route("/stats")
+class StatsResource(Resource):
+    @endpoint.expect(stats_parser)
+    @endpoint.response(200, "Success", [api_models["daily_stats_model"]])
+    def get(self):
+        args = stats_parser.parse_args()
+        rows = get_daily_stats(args["group"], args["value"], args["since"], args["until"], args["limit"])
+        return json_response(daily_stats_rows(rows))
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from urllib.parse import parse_qs
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags, quote_etag
+from config import Config
+from app import create_app
+from app.api_endpoints.routes import subreddit_rows
+from app.metrics import observe_request, set_endpoint_label
+from app.serialization import dumps, encode_body, negotiate_encoding, not_modified
+from app.services import async_keyword_services, shared_state
+from app.services.cache import response_cache
+from app.services.keyword_services import count_keyword_request, flush_keyword_requests, get_or_create_keyword_data
+
+# Async serving mode. GET /keyword_data is served on the event loop by
+# app/services/async_keyword_services.py, so thousands of slow cold lookups can wait on
+# Reddit at once in one process. Every other request goes to the Flask app through
+# asgiref's WSGI adapter, a thread per request as under a WSGI server. A request whose
+# client disconnects is cancelled, along with its Reddit fetch once no other request
+# is waiting on it. Run it with an ASGI server, e.g. `uvicorn asgi:app --workers 2`.
+
+# not an HTTP status: recorded in the request metrics for clients that went away
+CLIENT_CLOSED_REQUEST = 499
+
+
+def create_asgi_app(config_class=Config):
+    # Needs asgiref, asyncpraw and aiosqlite or asyncpg installed
+    flask_app = create_app(config_class)
+    with flask_app.app_context():
+        async_keyword_services.configure(flask_app)
+    return AsyncKeywordApp(flask_app)
+
+
+def _json(status, data, headers=()):
+    return status, [(b"content-type", b"application/json")] + list(headers), dumps(data)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class AsyncKeywordApp:
+    def __init__(self, flask_app):
+        from asgiref.wsgi import WsgiToAsgi
+
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self._poller = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == "/keyword_data" and scope["method"] == "GET":
+            await self.keyword_data(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._poller = asyncio.ensure_future(self.poll_shared_state())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._poller is not None:
+                    self._poller.cancel()
+                with self.flask_app.app_context():
+                    await async_keyword_services.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def poll_shared_state(self):
+        # shared_state.sync for the event loop; Flask's before_request hook covers the
+        # requests it serves
+        while True:
+            await asyncio.sleep(self.flask_app.config["SHARED_STATE_POLL_INTERVAL"])
+            with self.flask_app.app_context():
+                await async_keyword_services.run_sync(shared_state.sync)
+
+    async def keyword_data(self, scope, receive, send):
+        # Runs the request as a task and cancels it if the client disconnects first
+        started = time.perf_counter()
+        set_endpoint_label("/keyword_data")
+        query = parse_qs(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        args = {name: values[0] for name, values in query.items()}
+        labels = {}
+        with self.flask_app.app_context():
+            work = asyncio.ensure_future(self.get_keyword_data(scope, args, labels))
+            disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+            try:
+                await asyncio.wait((work, disconnect), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                disconnect.cancel()
+                disconnected = not work.done()
+                if disconnected:
+                    work.cancel()
+            if disconnected:
+                status = CLIENT_CLOSED_REQUEST
+            else:
+                try:
+                    status, headers, body = work.result()
+                except Exception:
+                    self.flask_app.logger.exception("Exception on /keyword_data [GET]")
+                    status, headers, body = _json(500, {"message": "Internal Server Error"})
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+            observe_request(time.perf_counter() - started, "/keyword_data", "GET", status, labels.get("keyword"))
+
+    async def get_keyword_data(self, scope, args, labels):
+        # KeywordDataResource.get: returns (status, headers, body), and sets labels["keyword"]
+        # (the metrics label) once the keyword is known to exist
+        keyword = args.get("keyword")
+        if keyword is None:
+            return _json(400, {
+                "errors": {"keyword": "Keyword to match on subreddits"},
+                "message": "Input payload validation failed",
+            })
+        if count_keyword_request(keyword):
+            await async_keyword_services.run_sync(flush_keyword_requests)
+
+        version = await async_keyword_services.get_keyword_version(keyword)
+        if version is not None:
+            labels["keyword"] = keyword
+            return await self.conditional_response(scope, keyword, version)
+
+        account_name, industry = args.get("account_name"), args.get("industry")
+        if not (account_name and industry) and not await async_keyword_services.keyword_exists(keyword):
+            return _json(400, {"message": 'Missing or invalid "account_name" or "industry" parameters. Provide both.'})
+
+        if self.flask_app.config["INGESTION_MODE"] == "worker":
+            await async_keyword_services.run_sync(get_or_create_keyword_data, keyword, account_name, industry)
+            labels["keyword"] = keyword
+            return _json(202, [])
+        rows = await async_keyword_services.fetch_cold_keyword(keyword, account_name, industry)
+        labels["keyword"] = keyword
+        return _json(200, subreddit_rows(rows))
+
+    async def conditional_response(self, scope, keyword, version):
+        # serialization.conditional_json_response, with the posts loaded on the event loop
+        request_headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        data_version = version.data_version or 0
+        etag = "%d.%d" % (version.id, data_version)
+        last_modified = version.data_modified or version.last_fetched
+        headers = [
+            (b"etag", quote_etag(etag, weak=True).encode()),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if last_modified is not None:
+            headers.append((b"last-modified", http_date(last_modified).encode()))
+        if not_modified(
+            etag,
+            last_modified,
+            parse_etags(request_headers.get("if-none-match")),
+            parse_date(request_headers.get("if-modified-since")),
+        ):
+            return 304, headers, b""
+
+        cache_key = (keyword, etag, negotiate_encoding(parse_accept_header(request_headers.get("accept-encoding"))))
+        cached = response_cache.get(cache_key)
+        if cached is None:
+            rows = await async_keyword_services.get_subreddit_data_by_keyword(keyword, data_version)
+            cached = encode_body(subreddit_rows(rows), cache_key[2])
+            response_cache.set(cache_key, cached)
+        body, encoding = cached
+        headers.append((b"content-type", b"application/json"))
+        if encoding is not None:
+            headers.append((b"content-encoding", encoding.encode()))
+        return 200, headers, body
@@ -0,0 +1,127 @@
+import json
+import sys
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.services.comment_services import ingest_comments
+from app.services.export_services import EXPORT_FORMATS, stream_export
+from app.services.import_services import IMPORT_FORMATS, import_keywords, parse_keyword_file
+from app.services.retention import full_vacuum, run_maintenance
+from app.services.rollup_services import rebuild_rollups
+from app.storage import copy_database, upgrade_schema
+
+# Flask CLI commands, registered on the app in create_app (run with `flask --app run <command>`)
+
+
+@click.command("export")
+@click.option("--format", "fmt", type=click.Choice(tuple(EXPORT_FORMATS)), default="ndjson", show_default=True)
+@click.option("--compression", default=None, help="gzip for ndjson/csv; snappy, gzip or zstd for parquet")
+@click.option("--keyword", default=None)
+@click.option("--industry", default=None)
+@click.option("--account-name", default=None)
+@click.option("--subreddit", default=None)
+@click.option("--since", type=click.DateTime(), default=None)
+@click.option("--until", type=click.DateTime(), default=None)
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True), default="-",
+              help="File to write, - for stdout")
+@with_appcontext
+def export_command(fmt, compression, output, **filters):
+    """Stream stored posts to a file as NDJSON, CSV or Parquet."""
+    try:
+        blocks, _, _ = stream_export(
+            fmt, compression, chunk_size=current_app.config["EXPORT_CHUNK_SIZE"], **filters
+        )
+    except ValueError as exc:
+        raise click.UsageError(str(exc))
+
+    stream = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        for block in blocks:
+            stream.write(block)
+    finally:
+        if stream is not sys.stdout.buffer:
+            stream.close()
+
+
+@click.command("import-keywords")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(IMPORT_FORMATS), default=None,
+              help="Default: csv for .csv files, json otherwise")
+@click.option("--account-name", default=None, help="For rows without their own")
+@click.option("--industry", default=None, help="For rows without their own")
+@click.option("--dry-run", is_flag=True, help="Only validate and report, write nothing")
+@click.option("--report", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Write the per-row report as JSON to this file")
+@with_appcontext
+def import_keywords_command(path, fmt, account_name, industry, dry_run, report):
+    """Register the keywords in a JSON or CSV file in one transaction."""
+    with click.open_file(path, "rb") as upload:
+        data = upload.read()
+    try:
+        rows = parse_keyword_file(data, fmt or ("csv" if path.lower().endswith(".csv") else "json"), account_name, industry)
+    except ValueError as exc:
+        raise click.UsageError(str(exc))
+
+    result = import_keywords(rows, current_app.config["KEYWORD_IMPORT_CHUNK_SIZE"], dry_run)
+    for entry in result["rows"]:
+        if entry.get("error"):
+            click.echo("row %d (%s): %s" % (entry["row"], entry["keyword"], entry["error"]), err=True)
+    if report:
+        with open(report, "w") as output:
+            json.dump(result, output, indent=2)
+    click.echo("%s%d created, %d updated, %d unchanged, %d duplicate, %d invalid" % (
+        "Dry run: " if dry_run else "",
+        result["created"], result["updated"], result["unchanged"], result["duplicate"], result["invalid"],
+    ))
+
+
+@click.command("upgrade-db")
+@with_appcontext
+def upgrade_db_command():
+    """Add missing tables, columns and indexes to the configured database."""
+    upgrade_schema()
+    click.echo("Database schema is up to date")
+
+
+@click.command("copy-db")
+@click.argument("target_url")
+@with_appcontext
+def copy_db_command(target_url):
+    """Copy every table of the configured database into TARGET_URL (e.g. Postgres)."""
+    upgrade_schema()
+    for table, count in copy_database(target_url).items():
+        click.echo("%s: %d rows" % (table, count))
+
+
+@click.command("ingest-comments")
+@click.option("--limit", type=int, default=None, help="Posts to expand (default COMMENT_POSTS_PER_RUN)")
+@click.option("--post", "posts", multiple=True, help="Reddit fullname of a post (t3_...) to expand; repeatable")
+@with_appcontext
+def ingest_comments_command(limit, posts):
+    """Fetch comment trees for stored posts that have none yet."""
+    posts_done, comments = ingest_comments(list(posts) or None, limit)
+    click.echo("Stored %d comments from %d posts" % (comments, posts_done))
+
+
+@click.command("maintenance")
+@click.option("--dry-run", is_flag=True, help="Only count the rows each retention policy would remove")
+@click.option("--no-vacuum", is_flag=True, help="Skip the incremental vacuum after deleting")
+@click.option("--full-vacuum", "full_vacuum_first", is_flag=True,
+              help="Rewrite the SQLite file with auto_vacuum=INCREMENTAL first (locks the db while it runs)")
+@with_appcontext
+def maintenance_command(dry_run, no_vacuum, full_vacuum_first):
+    """Archive and delete rows past the retention policies, then reclaim space."""
+    if full_vacuum_first and not dry_run:
+        full_vacuum()
+    report = run_maintenance(dry_run=dry_run, vacuum=not no_vacuum)
+    if report is None:
+        raise click.ClickException("Maintenance is already running in another process")
+    for table, result in report.items():
+        click.echo("%s: %s" % (table, result))
+
+
+@click.command("rebuild-stats")
+@with_appcontext
+def rebuild_stats_command():
+    """Recompute the /stats daily rollups from the stored posts."""
+    click.echo("Counted %d posts" % rebuild_rollups())
@@ -0,0 +1,271 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# In-process metrics with Prometheus text exposition (served on /metrics), plus the
+# hooks that feed them: request timing, SQLAlchemy query/commit timing, and an optional
+# per-request cProfile hook. Values are per process; under several workers each one
+# reports its own.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, _escape(value)) for name, value in labels)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.documentation), "# TYPE %s %s" % (self.name, self.type)]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return ["%s%s %r" % (self.name, _format_labels(key), float(value))]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def _render_value(self, key, value):
+        bucket_counts, count, total = value
+        lines = []
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            labels = key + (("le", repr(bound)),)
+            lines.append("%s_bucket%s %d" % (self.name, _format_labels(labels), bucket_count))
+        lines.append("%s_bucket%s %d" % (self.name, _format_labels(key + (("le", "+Inf"),)), count))
+        lines.append("%s_count%s %d" % (self.name, _format_labels(key), count))
+        lines.append("%s_sum%s %r" % (self.name, _format_labels(key), total))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests", ("endpoint", "method", "status")
+))
+KEYWORD_REQUEST_SECONDS = registry.register(Histogram(
+    "keyword_request_duration_seconds", "Time spent handling /keyword_data requests per keyword", ("keyword",)
+))
+REDDIT_CALL_SECONDS = registry.register(Histogram(
+    "reddit_call_duration_seconds", "Time spent in Reddit listing calls", ("endpoint", "keyword")
+))
+REDDIT_CALLS = registry.register(Counter(
+    "reddit_calls_total", "Reddit listing calls", ("keyword", "outcome")
+))
+REDDIT_RATELIMIT_REMAINING = registry.register(Gauge(
+    "reddit_ratelimit_remaining", "Requests left in the current Reddit rate-limit window", ("client_id",)
+))
+REDDIT_RATELIMIT_USED = registry.register(Gauge(
+    "reddit_ratelimit_used", "Requests used in the current Reddit rate-limit window", ("client_id",)
+))
+REDDIT_RATELIMIT_RESET = registry.register(Gauge(
+    "reddit_ratelimit_reset_timestamp_seconds", "Unix time the Reddit rate-limit window resets", ("client_id",)
+))
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "db_query_duration_seconds", "Time spent executing SQL statements", ("endpoint", "statement")
+))
+DB_COMMIT_SECONDS = registry.register(Histogram(
+    "db_commit_duration_seconds", "Time spent in session commits, including the flush", ("endpoint",)
+))
+SERIALIZE_SECONDS = registry.register(Histogram(
+    "response_serialize_duration_seconds", "Time spent marshalling and encoding responses", ("endpoint", "stage")
+))
+CACHE_REQUESTS = registry.register(Counter(
+    "keyword_cache_requests_total", "Keyword result cache lookups", ("result",)
+))
+
+
+# endpoint label for requests served outside Flask, i.e. by the async handlers in app/asgi.py
+_endpoint_label = ContextVar("metrics_endpoint", default=None)
+
+
+def current_endpoint():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return _endpoint_label.get() or "background"
+
+
+def set_endpoint_label(endpoint):
+    _endpoint_label.set(endpoint)
+
+
+@contextmanager
+def timer(histogram, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def record_reddit_limits(reddit, client_id):
+    # prawcore's view of the X-Ratelimit-* headers from the last response
+    limits = getattr(getattr(reddit, "auth", None), "limits", None) or {}
+    if limits.get("remaining") is not None:
+        REDDIT_RATELIMIT_REMAINING.set(limits["remaining"], client_id=client_id)
+    if limits.get("used") is not None:
+        REDDIT_RATELIMIT_USED.set(limits["used"], client_id=client_id)
+    if limits.get("reset_timestamp") is not None:
+        REDDIT_RATELIMIT_RESET.set(limits["reset_timestamp"], client_id=client_id)
+
+
+def _statement_kind(statement):
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return kind if kind in ("select", "insert", "update", "delete", "pragma") else "other"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    DB_QUERY_SECONDS.observe(
+        time.perf_counter() - started, endpoint=current_endpoint(), statement=_statement_kind(statement)
+    )
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started, endpoint=current_endpoint())
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    config = current_app.config
+    if config["PROFILING_ENABLED"] and (
+        request.headers.get("X-Profile") == "1" or request.args.get("_profile") == "1"
+    ):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        profile_dir = current_app.config["PROFILE_DIR"]
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, "%d-%s.prof" % (
+            time.time() * 1000, current_endpoint().strip("/").replace("/", "_") or "root"
+        ))
+        profiler.dump_stats(path)
+        response.headers["X-Profile-File"] = path
+
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        observe_request(
+            time.perf_counter() - started,
+            current_endpoint(),
+            request.method,
+            response.status_code,
+            g.pop("metrics_keyword", None),
+        )
+    return response
+
+
+def observe_request(elapsed, endpoint, method, status, keyword=None):
+    HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=method, status=status)
+    if keyword is not None and current_app.config["METRICS_PER_KEYWORD"]:
+        KEYWORD_REQUEST_SECONDS.observe(elapsed, keyword=keyword)
+
+
+def init_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+def keyword_label(keyword):
+    # per-keyword labels can be switched off if the keyword set is too large
+    if has_app_context() and not current_app.config["METRICS_PER_KEYWORD"]:
+        return ""
+    return keyword
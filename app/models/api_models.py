@@ -15,6 +15,18 @@ def create_api_models(api):
         },
     )
 
+    # Quota state of one pooled Reddit client
+    client_status_model = api.model(
+        "RedditClientStatus",
+        {
+            "client_id": fields.String(description="The Reddit client ID"),
+            "remaining": fields.Float(description="Requests left in the current rate-limit window"),
+            "used": fields.Integer(description="Requests used in the current rate-limit window"),
+            "reset_timestamp": fields.Float(description="Unix time the rate-limit window resets"),
+            "in_flight": fields.Integer(description="Fetches currently using this client"),
+        },
+    )
+
     # Define the API model for subreddit data
     subreddit_model = api.model(
         "Subreddit",
@@ -59,15 +71,113 @@ def create_api_models(api):
         {
             "id": fields.Integer(description="Log ID"),
             "log": fields.String(description="PRAW Log Message"),
+            "level": fields.String(description="Log level"),
             "timestamp": fields.DateTime(description="Timestamp"),
         },
     )
 
+    # Models for batch keyword fetching
+    keyword_batch_model = api.model(
+        "KeywordBatch",
+        {
+            "keywords": fields.List(
+                fields.String, required=True, description="Keywords to fetch"
+            ),
+            "account_name": fields.String(
+                description="The account, used when registering new keywords"
+            ),
+            "industry": fields.String(
+                description="The industry of the account, used when registering new keywords"
+            ),
+        },
+    )
+
+    keyword_status_model = api.model(
+        "KeywordStatus",
+        {
+            "keyword": fields.String(description="The keyword"),
+            "status": fields.String(
+                description="cached, fetched, queued, invalid or error",
+                enum=["cached", "fetched", "queued", "invalid", "error"],
+            ),
+            "count": fields.Integer(description="Number of posts fetched"),
+            "error": fields.String(description="Error message if the fetch failed"),
+        },
+    )
+
+    # Model for full-text search results
+    search_result_model = api.model(
+        "SearchResult",
+        {
+            "id": fields.Integer(description="Post row ID"),
+            "reddit_id": fields.String(description="Reddit fullname of the post"),
+            "subreddit": fields.String(description="The name of the subreddit"),
+            "title": fields.String(description="The title of the post"),
+            "comment": fields.String(description="The comment"),
+            "author": fields.String(description="The author of the post"),
+            "created_date": fields.DateTime(
+                description="The creation date of the post", dt_format="iso8601"
+            ),
+            "keyword_data_id": fields.Integer(description="ID of the associated keyword"),
+            "keyword": fields.String(description="The keyword the post was stored for"),
+            "rank": fields.Float(description="Relevance, higher is better"),
+        },
+    )
+
+    # Models for bulk keyword import reports
+    keyword_import_row_model = api.model(
+        "KeywordImportRow",
+        {
+            "row": fields.Integer(description="Row number in the upload, starting at 1"),
+            "keyword": fields.String(description="The keyword"),
+            "status": fields.String(
+                description="created, updated, unchanged, duplicate or invalid",
+                enum=["created", "updated", "unchanged", "duplicate", "invalid"],
+            ),
+            "error": fields.String(description="Why the row was not imported"),
+        },
+    )
+
+    keyword_import_model = api.model(
+        "KeywordImport",
+        {
+            "created": fields.Integer(description="Keywords registered"),
+            "updated": fields.Integer(description="Existing keywords given a new account_name or industry"),
+            "unchanged": fields.Integer(description="Existing keywords that already matched"),
+            "duplicate": fields.Integer(description="Rows repeating an earlier keyword in the upload"),
+            "invalid": fields.Integer(description="Rows that failed validation"),
+            "dry_run": fields.Boolean(description="True if nothing was written"),
+            "rows": fields.List(fields.Nested(keyword_import_row_model), description="Outcome of every row"),
+        },
+    )
+
+    # Model for one /stats daily rollup row
+    daily_stats_model = api.model(
+        "DailyStats",
+        {
+            "dimension": fields.String(
+                description="What the posts are grouped by",
+                enum=["subreddit", "industry", "account_name"],
+            ),
+            "value": fields.String(description="The subreddit, industry or account name"),
+            "day": fields.Date(description="The UTC day the posts were created"),
+            "post_count": fields.Integer(description="Posts created that day"),
+            "author_count": fields.Integer(description="Distinct authors of those posts"),
+            "first_post": fields.DateTime(description="Creation time of the day's first post", dt_format="iso8601"),
+            "last_post": fields.DateTime(description="Creation time of the day's last post", dt_format="iso8601"),
+        },
+    )
+
     return {
         "credential_model": credential_model,
+        "client_status_model": client_status_model,
         "subreddit_model": subreddit_model,
         "keyword_model": keyword_model,
-        "praw_log_model": praw_log_model
-
+        "praw_log_model": praw_log_model,
+        "keyword_batch_model": keyword_batch_model,
+        "keyword_status_model": keyword_status_model,
+        "search_result_model": search_result_model,
+        "keyword_import_model": keyword_import_model,
+        "daily_stats_model": daily_stats_model,
     }
 
@@ -12,23 +12,160 @@ class KeywordData(db.Model):
     account_name = db.Column(db.String(100), nullable=False)
     industry = db.Column(db.String(100), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # when posts for this keyword were last pulled from Reddit
+    last_fetched = db.Column(db.DateTime, nullable=True)
+    # fullname of the newest post stored for this keyword; refreshes stop once they reach it
+    newest_fullname = db.Column(db.String(16), nullable=True)
+    # /keyword_data reads, used by the ingestion worker to prioritise refreshes
+    request_count = db.Column(db.Integer, default=0, nullable=True)
+    last_requested = db.Column(db.DateTime, nullable=True)
+    # bumped whenever a fetch writes posts; with the keyword id it is the /keyword_data ETag
+    data_version = db.Column(db.Integer, default=0, nullable=True)
+    data_modified = db.Column(db.DateTime, nullable=True)
 
 
-# Define the SQLAlchemy model for subreddit data
-class SubredditData(db.Model):
+# Each Reddit submission is stored once, however many keywords fetch it; KeywordPost
+# links it to those keywords. content_hash covers the text a re-fetch can change, so
+# unchanged posts are not rewritten. comments_fetched finds posts awaiting comment
+# ingestion.
+class PostData(db.Model):
+    __table_args__ = (
+        db.Index("ux_post_data_reddit_id", "reddit_id", unique=True),
+        db.Index("ix_post_data_created", "created_date"),
+        db.Index("ix_post_data_comments_fetched", "comments_fetched"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    # Reddit fullname of the submission (e.g. t3_abc123); only rows migrated from before
+    # fullnames were recorded lack one
+    reddit_id = db.Column(db.String(16), nullable=True)
     subreddit = db.Column(db.String(21), nullable=False)
     comment = db.Column(db.Text, nullable=False)
     created_date = db.Column(db.DateTime, nullable=False)
     author = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(32), nullable=True)
+    # when the post's comment tree was last ingested into CommentData
+    comments_fetched = db.Column(db.DateTime, nullable=True)
+
+
+# Which keywords fetched which posts. created_date is copied from the post so keyword
+# reads, date-range filters and retention stay on this table's indexes.
+class KeywordPost(db.Model):
+    __table_args__ = (
+        db.Index("ux_keyword_post_keyword_post", "keyword_data_id", "post_id", unique=True),
+        db.Index("ix_keyword_post_keyword_created", "keyword_data_id", "created_date"),
+        db.Index("ix_keyword_post_post", "post_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
     keyword_data_id = db.Column(
         db.Integer, db.ForeignKey("keyword_data.id"), nullable=False
     )
+    post_id = db.Column(db.Integer, db.ForeignKey("post_data.id"), nullable=False)
+    created_date = db.Column(db.DateTime, nullable=False)
+
+
+# Comments on stored posts, linked by the post's Reddit fullname
+class CommentData(db.Model):
+    __table_args__ = (
+        db.Index("ux_comment_data_reddit_id", "reddit_id", unique=True),
+        db.Index("ix_comment_data_post_created", "post_reddit_id", "created_date"),
+        db.Index("ix_comment_data_created", "created_date"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    reddit_id = db.Column(db.String(16), nullable=False)  # t1_...
+    post_reddit_id = db.Column(db.String(16), nullable=False)  # t3_...
+    parent_reddit_id = db.Column(db.String(16), nullable=False)  # the post or a parent comment
+    author = db.Column(db.String(50), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    score = db.Column(db.Integer, nullable=True)
+    depth = db.Column(db.Integer, nullable=False)
+    created_date = db.Column(db.DateTime, nullable=False)
+
+
+# Post rollups per day for each subreddit, industry and account_name, maintained as
+# posts are first linked to a keyword (app/services/rollup_services.py). They are
+# history: rows are kept when retention deletes the posts they count.
+class DailyStats(db.Model):
+    __table_args__ = (
+        db.Index("ux_daily_stats_dimension_value_day", "dimension", "value", "day", unique=True),
+        db.Index("ix_daily_stats_dimension_day", "dimension", "day"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)  # subreddit, industry or account_name
+    value = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    post_count = db.Column(db.Integer, nullable=False)
+    author_count = db.Column(db.Integer, nullable=False)
+    first_post = db.Column(db.DateTime, nullable=False)
+    last_post = db.Column(db.DateTime, nullable=False)
+
+
+# The distinct authors behind each DailyStats.author_count
+class DailyStatsAuthor(db.Model):
+    __table_args__ = (
+        db.Index("ux_daily_stats_author", "dimension", "value", "day", "author", unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)
+    value = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    author = db.Column(db.String(50), nullable=False)
+
+
+# One row per keyword refresh run by the ingestion worker
+class IngestionJob(db.Model):
+    __table_args__ = (db.Index("ix_ingestion_job_keyword_started", "keyword_data_id", "started_at"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    keyword_data_id = db.Column(
+        db.Integer, db.ForeignKey("keyword_data.id"), nullable=False
+    )
+    status = db.Column(db.String(10), nullable=False)  # running, succeeded, partial or failed
+    priority = db.Column(db.Float, nullable=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Float, nullable=True)
+    posts_fetched = db.Column(db.Integer, nullable=True)
+    requests_used = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+
+# Cross-process lease on a Reddit fetch, so only one process fetches a key at a time
+class FetchLease(db.Model):
+    key = db.Column(db.String(150), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+# Named JSON values shared by every process (e.g. the pooled Reddit credentials) when
+# the shared state backend is the database. version is bumped on every write, so
+# processes poll for changes by comparing versions.
+class SharedState(db.Model):
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
 
 
 # Database model for PRAW logs
 class PRAWLogData(db.Model):
+    # /praw_logs pages through the table newest-first on (timestamp, id)
+    __table_args__ = (db.Index("ix_praw_log_data_timestamp_id", "timestamp", "id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     log = db.Column(db.String(255), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    level = db.Column(db.String(10), nullable=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Fingerprint of the models the database schema was last upgraded to (a single row);
+# lets startup skip the schema upgrade when nothing changed
+class SchemaVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    upgraded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,121 @@
+import gzip
+import json
+from datetime import timezone
+from operator import itemgetter
+from flask import Response, current_app, request
+from app.metrics import SERIALIZE_SECONDS, current_endpoint, timer
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+# Fast response path for large result lists. Rows (SQLAlchemy column tuples or dicts)
+# are projected straight onto the field names of a create_api_models model and encoded
+# in one call, instead of going through flask-restx marshalling field by field. The
+# models stay the source of truth for the Swagger docs and for which keys are returned.
+
+
+def _default(value):
+    # datetimes are the only non-JSON values the column queries return
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+
+def dumps(data):
+    # JSON bytes; naive datetimes come out as ISO 8601, same as fields.DateTime
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode()
+
+
+def row_serializer(model):
+    # Returns a function turning an iterable of rows into a list of dicts with exactly
+    # the model's keys, in the model's order
+    names = tuple(model.keys())
+    getter = itemgetter(*names)
+    if len(names) == 1:
+        def project(mapping):
+            return {names[0]: getter(mapping)}
+    else:
+        def project(mapping):
+            return dict(zip(names, getter(mapping)))
+
+    def serialize(rows):
+        with timer(SERIALIZE_SECONDS, endpoint=current_endpoint(), stage="marshal"):
+            return [project(row if isinstance(row, dict) else row._mapping) for row in rows]
+
+    return serialize
+
+
+def json_response(data, status=200, headers=None):
+    # Bypasses the Api representation so the encoded bytes go out as they are
+    with timer(SERIALIZE_SECONDS, endpoint=current_endpoint(), stage="encode"):
+        body = dumps(data)
+    return Response(body, status=status, headers=headers, mimetype="application/json")
+
+
+def negotiate_encoding(accept_encodings=None):
+    # Best Content-Encoding the client accepts (default: the current request's
+    # Accept-Encoding): br (when brotli is installed), gzip, or None for an uncompressed body
+    if accept_encodings is None:
+        accept_encodings = request.accept_encodings
+    offered = ["br", "gzip", "identity"] if brotli is not None else ["gzip", "identity"]
+    encoding = accept_encodings.best_match(offered)
+    return None if encoding in (None, "identity") else encoding
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def not_modified(etag, last_modified, if_none_match, if_modified_since):
+    # Whether the client's parsed If-None-Match/If-Modified-Since still match
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    if if_modified_since and last_modified is not None:
+        # HTTP dates have whole-second precision
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= if_modified_since
+    return False
+
+
+def encode_body(data, encoding):
+    # (body, content encoding) for `data`; bodies too small to be worth it stay uncompressed
+    with timer(SERIALIZE_SECONDS, endpoint=current_endpoint(), stage="encode"):
+        body = dumps(data)
+    if len(body) < current_app.config["RESPONSE_COMPRESSION_MIN_SIZE"]:
+        encoding = None
+    with timer(SERIALIZE_SECONDS, endpoint=current_endpoint(), stage="compress"):
+        return compress(body, encoding), encoding
+
+
+def conditional_json_response(cache, key, etag, last_modified, load):
+    # 304 when the client's If-None-Match/If-Modified-Since still matches; otherwise
+    # the body for the negotiated encoding, built with load() and encoded only once per
+    # (key, etag, encoding) while it stays in `cache` as (body, content encoding)
+    if not_modified(etag, last_modified, request.if_none_match, request.if_modified_since):
+        response = Response(status=304)
+    else:
+        cache_key = (key, etag, negotiate_encoding())
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = encode_body(load(), cache_key[2])
+            cache.set(cache_key, cached)
+        body, encoding = cached
+        response = Response(body, mimetype="application/json")
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.vary.add("Accept-Encoding")
+    return response
@@ -0,0 +1,276 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from app.metrics import REDDIT_CALL_SECONDS, REDDIT_CALLS, current_endpoint, keyword_label, record_reddit_limits
+from app.models.db_models import KeywordData
+from app.services import shared_state
+from app.services.cache import keyword_cache
+from app.services.keyword_services import (
+    cache_keyword_posts,
+    cached_keyword_posts,
+    finish_fetch,
+    get_keyword_cursor,
+    get_or_create_keyword_data,
+    is_stale,
+    keyword_posts_query,
+    keyword_version_query,
+    listing_arguments,
+    listing_specs,
+    store_fetched_chunk,
+    submission_row,
+)
+from app.services.reddit_clients import reddit_clients
+from app.services.singleflight import acquire_lease, async_keyword_flights, holding_lease, release_lease
+from app.storage import create_async_db_engine
+
+# Coroutine versions of the /keyword_data read and fetch paths, for the async serving
+# mode (app/asgi.py). Reads go through the async engine and Reddit through asyncpraw,
+# so a request waiting on either holds no thread. Writes reuse the sync services on a
+# small thread pool: committing a chunk of posts takes milliseconds, a Reddit page can
+# take seconds. The caches, single-flight and leases are shared with the sync path.
+
+_engine = None
+_write_executor = None
+
+
+def configure(app):
+    # Needs an app context: the async engine's default URL comes from db.engine
+    global _engine, _write_executor
+    _engine = create_async_db_engine(app.config["ASYNC_DATABASE_URL"], app.config.get("SQLALCHEMY_ENGINE_OPTIONS"))
+    _write_executor = ThreadPoolExecutor(max_workers=app.config["ASYNC_WRITE_THREADS"], thread_name_prefix="async-write")
+
+
+async def shutdown():
+    # Closes the async engine's connections and the asyncpraw sessions
+    await _engine.dispose()
+    await reddit_clients.aclose()
+
+
+def _call_in_app_context(app, fn, args):
+    with app.app_context():
+        return fn(*args)
+
+
+async def run_sync(fn, *args):
+    # Runs fn(*args) on the write pool, in a fresh app context (so with its own db
+    # session) that keeps the caller's context variables, e.g. the metrics endpoint label
+    app = current_app._get_current_object()
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _write_executor, context.run, _call_in_app_context, app, fn, args
+    )
+
+
+async def _fetch_rows(statement):
+    async with _engine.connect() as connection:
+        return (await connection.execute(statement)).all()
+
+
+async def keyword_exists(keyword):
+    return bool(await _fetch_rows(select(KeywordData.id).where(KeywordData.keyword == keyword)))
+
+
+async def get_keyword_version(keyword):
+    # keyword_services.get_keyword_version on the async engine
+    rows = await _fetch_rows(keyword_version_query(keyword))
+    if not rows or rows[0].last_fetched is None:
+        return None
+    if is_stale(rows[0].last_fetched) and current_app.config["INGESTION_MODE"] == "inline":
+        schedule_refresh(keyword)
+    return rows[0]
+
+
+async def get_subreddit_data_by_keyword(keyword, data_version=None):
+    # keyword_services.get_subreddit_data_by_keyword on the async engine
+    cached = cached_keyword_posts(keyword, data_version)
+    if cached is None:
+        cached = cache_keyword_posts(keyword, await _fetch_rows(keyword_posts_query(keyword)))
+        if cached is None:
+            return None
+    subreddit_data_list, last_fetched, _ = cached
+    if is_stale(last_fetched) and current_app.config["INGESTION_MODE"] == "inline":
+        schedule_refresh(keyword)
+    return subreddit_data_list
+
+
+@asynccontextmanager
+async def fetch_lease(key, ttl=None):
+    # singleflight.fetch_lease for coroutines. A cancelled caller cannot stop the pool
+    # thread taking the lease, so the acquire is shielded and, once it has finished, a
+    # lease it took is released instead of being held until it expires.
+    acquiring = asyncio.ensure_future(run_sync(acquire_lease, key, ttl))
+    try:
+        owner = await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        owner = await acquiring
+        if owner is not None:
+            await run_sync(release_lease, key, owner)
+        raise
+    if owner is None:
+        yield False
+        return
+    try:
+        with holding_lease(key, owner, ttl):
+            yield True
+    finally:
+        await run_sync(release_lease, key, owner)
+
+
+async def wait_for_lease(key, timeout=None):
+    # singleflight.wait_for_lease for coroutines
+    config = current_app.config
+    deadline = time.monotonic() + (timeout or config["FETCH_LEASE_TTL"])
+    while time.monotonic() < deadline:
+        if not await run_sync(shared_state.backend().lease_held, key):
+            return True
+        await asyncio.sleep(config["FETCH_LEASE_POLL_INTERVAL"])
+    return False
+
+
+_refresh_tasks = {}
+_refresh_failed_at = {}
+
+
+def schedule_refresh(keyword):
+    # keyword_services.schedule_refresh as a task on the event loop: at most one per
+    # keyword, and failures back off for KEYWORD_REFRESH_RETRY seconds
+    if keyword in _refresh_tasks:
+        return False
+    failed_at = _refresh_failed_at.get(keyword)
+    if failed_at is not None and time.monotonic() - failed_at < current_app.config["KEYWORD_REFRESH_RETRY"]:
+        return False
+    _refresh_tasks[keyword] = asyncio.ensure_future(_refresh_keyword(current_app._get_current_object(), keyword))
+    return True
+
+
+async def _refresh_keyword(app, keyword):
+    try:
+        with app.app_context():
+            rows = await _fetch_rows(select(KeywordData.id).where(KeywordData.keyword == keyword))
+            async with fetch_lease("keyword:" + keyword) as acquired:
+                # without the lease another process is already refreshing this keyword
+                if rows and acquired:
+                    await fetch_and_store_reddit_data(keyword, rows[0].id)
+        _refresh_failed_at.pop(keyword, None)
+    except Exception:
+        app.logger.exception("Background refresh failed for keyword %r", keyword)
+        _refresh_failed_at[keyword] = time.monotonic()
+    finally:
+        _refresh_tasks.pop(keyword, None)
+
+
+async def iter_reddit_submissions(reddit, keyword, listing="new", time_filter="all", limit=None, rate_limiter=None,
+                                  before=None):
+    # keyword_services.iter_reddit_submissions over an asyncpraw client
+    if limit is None:
+        config = current_app.config
+        limit = config["REDDIT_FETCH_LIMIT"] if before is None else config["REDDIT_REFRESH_DEPTH"]
+    before_fullname, before_created = (before or (None, None)) if listing == "new" else (None, None)
+    label = keyword_label(keyword)
+    outcome = "error"
+    waited = 0.0  # time spent in Reddit calls only, not in the consumer
+    try:
+        arguments = listing_arguments(listing, time_filter, limit)
+        subreddit = await reddit.subreddit(keyword)
+        submissions = getattr(subreddit, listing)(**arguments).__aiter__()
+        index = 0
+        while True:
+            if rate_limiter is not None and index % 100 == 0 and index < limit:
+                await rate_limiter.acquire_async()  # one listing page per 100 submissions
+            started = time.perf_counter()
+            submission = await anext(submissions, None)
+            waited += time.perf_counter() - started
+            if submission is None:
+                break
+            index += 1
+            created_date = datetime.utcfromtimestamp(submission.created_utc)
+            if submission.fullname == before_fullname or (before_created and created_date < before_created):
+                break
+            yield submission_row(submission, created_date)
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        REDDIT_CALL_SECONDS.observe(waited, endpoint=current_endpoint(), keyword=label)
+        REDDIT_CALLS.inc(keyword=label, outcome=outcome)
+        record_reddit_limits(reddit, getattr(getattr(reddit, "config", None), "client_id", "default"))
+
+
+async def chunked(aiterable, size):
+    chunk = []
+    async for item in aiterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _keyword_cursor(keyword_data_id):
+    return get_keyword_cursor(db.session.get(KeywordData, keyword_data_id))
+
+
+async def fetch_and_store_reddit_data(keyword, keyword_data_id, listings=None):
+    # keyword_services.fetch_and_store_reddit_data with the Reddit side on asyncpraw.
+    # Cancelling it stops the fetch at the next page; chunks already handed to the
+    # write pool are still committed, as after a failed sync fetch.
+    config = current_app.config
+    before = await run_sync(_keyword_cursor, keyword_data_id)
+    newest_fullname = None
+    stored = 0
+    for listing, time_filter, limit in listing_specs(listings):
+        async with reddit_clients.async_client() as client:
+            submissions = iter_reddit_submissions(
+                client.async_reddit,
+                keyword,
+                listing=listing,
+                time_filter=time_filter,
+                limit=limit,
+                rate_limiter=client.rate_limiter,
+                before=before,
+            )
+            async with aclosing(submissions):
+                async for chunk in chunked(submissions, config["INGEST_CHUNK_SIZE"]):
+                    if listing == "new" and newest_fullname is None:
+                        newest_fullname = chunk[0]["reddit_id"]
+                    stored += await run_sync(store_fetched_chunk, keyword, keyword_data_id, chunk)
+
+    await run_sync(finish_fetch, keyword, keyword_data_id, newest_fullname)
+    return stored
+
+
+def _keyword_data_id(keyword, account_name, industry):
+    return get_or_create_keyword_data(keyword, account_name, industry).id
+
+
+async def fetch_cold_keyword(keyword, account_name=None, industry=None):
+    # keyword_services.fetch_cold_keyword for coroutines. Concurrent callers share one
+    # fetch, which is cancelled if every one of them goes away (e.g. disconnects).
+    app = current_app._get_current_object()
+    return await async_keyword_flights.do(
+        keyword, lambda: _fetch_cold_keyword(app, keyword, account_name, industry)
+    )
+
+
+async def _fetch_cold_keyword(app, keyword, account_name, industry):
+    with app.app_context():
+        keyword_data_id = await run_sync(_keyword_data_id, keyword, account_name, industry)
+        while True:
+            async with fetch_lease("keyword:" + keyword) as acquired:
+                if acquired:
+                    await fetch_and_store_reddit_data(keyword, keyword_data_id)
+                    return await get_subreddit_data_by_keyword(keyword)
+            await wait_for_lease("keyword:" + keyword)
+            rows = await _fetch_rows(keyword_version_query(keyword))
+            if rows and rows[0].last_fetched is not None:
+                keyword_cache.pop(keyword)
+                return await get_subreddit_data_by_keyword(keyword)
+            # the other process gave up without fetching; try to take over
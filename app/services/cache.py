@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+
+# Small thread-safe in-process LRU used to keep serialized keyword results in memory.
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# serialized /keyword_data results keyed by keyword: (rows, last_fetched, data_version)
+keyword_cache = LRUCache()
+
+# encoded /keyword_data bodies keyed by (keyword, etag, content encoding)
+response_cache = LRUCache()
+
+
+def clear_caches(generation=None):
+    # Drops every cached result; registered as the shared cache generation's watcher, so
+    # invalidate_caches() in any process clears them all
+    keyword_cache.clear()
+    response_cache.clear()
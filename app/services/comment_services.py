@@ -0,0 +1,142 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models.db_models import CommentData, PostData
+from app.services.rate_limit import RequestBudgetExceeded
+from app.services.reddit_clients import reddit_clients
+from app.storage import dialect_insert
+
+# Comment-tree ingestion for stored posts. Each post's comment forest is expanded with
+# replace_more within a per-post request budget, across a bounded pool of threads that
+# borrow pooled Reddit clients, and the comments are bulk-upserted in batches.
+
+
+def _strip_prefix(fullname):
+    return fullname.split("_", 1)[1] if "_" in fullname else fullname
+
+
+def fetch_comment_rows(reddit, post_reddit_id, rate_limiter=None, more_budget=32, max_depth=None):
+    # Network-only: returns the post's comments as row dicts. Each MoreComments expansion
+    # is one Reddit request; up to `more_budget` of them are made in one replace_more call
+    # (which drops the stubs it skips), so their tokens are taken from the rate limiter up
+    # front. Comments deeper than `max_depth` (0 = top level only) are skipped.
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    submission = reddit.submission(id=_strip_prefix(post_reddit_id))
+    forest = submission.comments
+    if rate_limiter is not None:
+        # in pieces: the bucket never holds more than its capacity
+        remaining = more_budget
+        while remaining > 0:
+            tokens = min(remaining, max(1, int(rate_limiter.capacity)))
+            rate_limiter.acquire(tokens)
+            remaining -= tokens
+    forest.replace_more(limit=more_budget)
+
+    rows = []
+    stack = [(comment, 0) for comment in reversed(list(forest))]
+    while stack:
+        comment, depth = stack.pop()
+        rows.append({
+            "reddit_id": comment.fullname,
+            "post_reddit_id": post_reddit_id,
+            "parent_reddit_id": comment.parent_id,
+            "author": comment.author.name if comment.author else "Unknown",
+            "body": comment.body,
+            "score": comment.score,
+            "depth": depth,
+            "created_date": datetime.utcfromtimestamp(comment.created_utc),
+        })
+        if max_depth is None or depth < max_depth:
+            stack.extend((reply, depth + 1) for reply in reversed(list(comment.replies)))
+    return rows
+
+
+def upsert_comment_data(rows):
+    # INSERT .. ON CONFLICT (reddit_id) DO UPDATE: re-ingesting a thread refreshes
+    # scores and edited bodies
+    if not rows:
+        return
+    stmt = dialect_insert(CommentData.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["reddit_id"],
+        set_={"body": stmt.excluded.body, "score": stmt.excluded.score, "author": stmt.excluded.author},
+    )
+    db.session.execute(stmt, rows)
+
+
+def posts_awaiting_comments(limit):
+    # Newest first: fresh threads are the ones still gaining comments
+    rows = (
+        db.session.query(PostData.reddit_id)
+        .filter(PostData.comments_fetched.is_(None), PostData.reddit_id.isnot(None))
+        .order_by(PostData.created_date.desc())
+        .limit(limit)
+        .all()
+    )
+    return [reddit_id for (reddit_id,) in rows]
+
+
+def _fetch_with_pooled_client(post_reddit_id, more_budget, max_depth):
+    with reddit_clients.client() as client:
+        return fetch_comment_rows(client.reddit, post_reddit_id, client.rate_limiter, more_budget, max_depth)
+
+
+def ingest_comments(post_reddit_ids=None, limit=None):
+    # Expands comment trees for `post_reddit_ids` (default: up to `limit` posts that have
+    # none yet). Comments are written every COMMENT_INSERT_BATCH rows, and a post is marked
+    # done in the same commit as its last comments, so an interrupted run resumes with the
+    # posts it had not finished. Returns (posts done, comments stored).
+    config = current_app.config
+    if post_reddit_ids is None:
+        post_reddit_ids = posts_awaiting_comments(limit or config["COMMENT_POSTS_PER_RUN"])
+    if not post_reddit_ids:
+        return 0, 0
+
+    batch_size = config["COMMENT_INSERT_BATCH"]
+    pending_rows, pending_posts = [], []
+    posts_done = comments_stored = 0
+
+    def flush():
+        for offset in range(0, len(pending_rows), batch_size):
+            upsert_comment_data(pending_rows[offset:offset + batch_size])
+        PostData.query.filter(PostData.reddit_id.in_(pending_posts)).update(
+            {"comments_fetched": datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+        del pending_rows[:]
+        del pending_posts[:]
+
+    max_workers = min(config["COMMENT_WORKERS"], len(post_reddit_ids))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="comment-ingest") as executor:
+        # each fetch runs in a copy of this context, so an active request budget counts it
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run,
+                _fetch_with_pooled_client,
+                post_reddit_id,
+                config["COMMENT_MORE_BUDGET"],
+                config["COMMENT_MAX_DEPTH"],
+            ): post_reddit_id
+            for post_reddit_id in post_reddit_ids
+        }
+        for future in as_completed(futures):
+            try:
+                rows = future.result()
+            except RequestBudgetExceeded:
+                continue  # left unmarked for the next run, like a failure
+            except Exception:
+                # left unmarked, so the next run retries it
+                current_app.logger.exception("Comment ingestion failed for post %s", futures[future])
+                continue
+            pending_rows.extend(rows)
+            pending_posts.append(futures[future])
+            posts_done += 1
+            comments_stored += len(rows)
+            if len(pending_rows) >= batch_size:
+                flush()
+    if pending_posts:
+        flush()
+    return posts_done, comments_stored
@@ -0,0 +1,177 @@
+import csv
+import io
+import zlib
+from app import db
+from app.models.db_models import KeywordData, KeywordPost, PostData
+from app.serialization import dumps
+
+# Streaming bulk export of stored posts, one row per keyword that fetched a post. Rows
+# are read off the db cursor in fixed-size chunks and encoded chunk by chunk, so the
+# full result set is never held in memory.
+
+EXPORT_COLUMNS = (
+    ("id", PostData.id),
+    ("reddit_id", PostData.reddit_id),
+    ("keyword", KeywordData.keyword),
+    ("account_name", KeywordData.account_name),
+    ("industry", KeywordData.industry),
+    ("subreddit", PostData.subreddit),
+    ("title", PostData.title),
+    ("comment", PostData.comment),
+    ("author", PostData.author),
+    ("created_date", PostData.created_date),
+)
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# column codecs pyarrow's parquet writer accepts
+PARQUET_COMPRESSIONS = ("snappy", "gzip", "zstd", "brotli", "lz4", "none")
+
+
+def export_query(keyword=None, industry=None, account_name=None, subreddit=None, since=None, until=None):
+    query = (
+        db.session.query(*[column for _, column in EXPORT_COLUMNS])
+        .select_from(KeywordPost)
+        .join(PostData, PostData.id == KeywordPost.post_id)
+        .join(KeywordData, KeywordPost.keyword_data_id == KeywordData.id)
+    )
+    if keyword:
+        query = query.filter(KeywordData.keyword == keyword)
+    if industry:
+        query = query.filter(KeywordData.industry == industry)
+    if account_name:
+        query = query.filter(KeywordData.account_name == account_name)
+    if subreddit:
+        query = query.filter(PostData.subreddit == subreddit)
+    if since is not None:
+        query = query.filter(KeywordPost.created_date >= since)
+    if until is not None:
+        query = query.filter(KeywordPost.created_date < until)
+    return query.order_by(KeywordPost.id)
+
+
+def iter_chunks(query, chunk_size):
+    chunk = []
+    for row in query.yield_per(chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _ndjson_chunks(chunks):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for chunk in chunks:
+        yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in chunk)
+
+
+def _csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _StreamSink:
+    # Write-only file object that hands out what has been written so far while keeping
+    # tell() monotonic, which the parquet footer offsets depend on
+    def __init__(self):
+        self.closed = False
+        self._blocks = []
+        self._position = 0
+
+    def write(self, data):
+        self._blocks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._blocks)
+        self._blocks = []
+        return data
+
+
+def _parquet_chunks(chunks, compression):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("reddit_id", pa.string()),
+        ("keyword", pa.string()),
+        ("account_name", pa.string()),
+        ("industry", pa.string()),
+        ("subreddit", pa.string()),
+        ("title", pa.string()),
+        ("comment", pa.string()),
+        ("author", pa.string()),
+        ("created_date", pa.timestamp("us")),
+    ])
+    # Each chunk becomes a row group; whatever the writer has flushed so far is yielded
+    sink = _StreamSink()
+    with pq.ParquetWriter(sink, schema, compression=compression or "none") as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _gzip(blocks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(fmt, compression=None, chunk_size=5000, **filters):
+    # Returns (byte generator, mimetype, filename). For parquet, `compression` is the
+    # column codec (one of PARQUET_COMPRESSIONS); for ndjson/csv, "gzip" wraps the
+    # stream. Everything is checked before the first byte, so errors can still be a 400.
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("Unsupported export format: %s" % fmt)
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    chunks = iter_chunks(export_query(**filters), chunk_size)
+
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow to be installed")
+        if compression and compression not in PARQUET_COMPRESSIONS:
+            raise ValueError("Unsupported compression for parquet: %s (expected one of %s)"
+                             % (compression, ", ".join(PARQUET_COMPRESSIONS)))
+        return _parquet_chunks(chunks, compression), mimetype, "export.parquet"
+
+    blocks = _ndjson_chunks(chunks) if fmt == "ndjson" else _csv_chunks(chunks)
+    filename = "export." + extension
+    if compression == "gzip":
+        return _gzip(blocks), "application/gzip", filename + ".gz"
+    if compression:
+        raise ValueError("Unsupported compression for %s: %s" % (fmt, compression))
+    return blocks, mimetype, filename
@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+from collections import Counter
+from app import db
+from app.models.db_models import KeywordData
+from app.services.keyword_services import chunked, validate_keyword_row
+from app.storage import dialect_insert
+
+# Bulk keyword registration, e.g. when onboarding an account with hundreds of keywords.
+# Every row of a JSON or CSV upload is validated first; the valid ones are then written
+# with chunked executemany upserts in a single transaction, and each row gets an outcome
+# in the returned report.
+
+IMPORT_FORMATS = ("json", "csv")
+IMPORT_STATUSES = ("created", "updated", "unchanged", "duplicate", "invalid")
+
+def _text(value, default=None):
+    if value is None:
+        return default
+    value = str(value).strip()
+    return value or default
+
+
+def parse_keyword_file(data, fmt, account_name=None, industry=None):
+    # Returns one {"keyword", "account_name", "industry"} dict per uploaded row.
+    # CSV needs a header with a keyword column (account_name and industry optional).
+    # JSON is a list, or {"keywords": [...], "account_name": ..., "industry": ...}, of
+    # keyword strings or objects. account_name/industry fill in rows without their own.
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(data))
+        if not reader.fieldnames or "keyword" not in reader.fieldnames:
+            raise ValueError('CSV needs a header row with a "keyword" column')
+        items = list(reader)
+    elif fmt == "json":
+        try:
+            payload = json.loads(data)
+        except ValueError as exc:
+            raise ValueError("Invalid JSON: %s" % exc)
+        if isinstance(payload, dict):
+            account_name = _text(payload.get("account_name"), account_name)
+            industry = _text(payload.get("industry"), industry)
+            payload = payload.get("keywords")
+        if not isinstance(payload, list):
+            raise ValueError('Expected a list of keywords or {"keywords": [...]}')
+        items = [{"keyword": item} if not isinstance(item, dict) else item for item in payload]
+    else:
+        raise ValueError("Unknown format %r, expected one of %s" % (fmt, ", ".join(IMPORT_FORMATS)))
+
+    return [
+        {
+            "keyword": _text(item.get("keyword")),
+            "account_name": _text(item.get("account_name"), account_name),
+            "industry": _text(item.get("industry"), industry),
+        }
+        for item in items
+    ]
+
+
+def import_keywords(rows, chunk_size=500, dry_run=False):
+    # Registers the parsed rows; a keyword already registered gets the row's
+    # account_name and industry. Nothing is written unless every chunk succeeds, and
+    # with dry_run nothing is written at all. Returns the counts per status plus one
+    # {"row", "keyword", "status", "error"} entry per row (rows numbered from 1).
+    report = []
+    valid = {}
+    for number, row in enumerate(rows, 1):
+        entry = {"row": number, "keyword": row["keyword"]}
+        error = validate_keyword_row(row)
+        if error is None and row["keyword"] in valid:
+            entry["status"] = "duplicate"
+            entry["error"] = "same keyword as row %d" % valid[row["keyword"]][0]["row"]
+        elif error is not None:
+            entry["status"] = "invalid"
+            entry["error"] = error
+        else:
+            valid[row["keyword"]] = (entry, row)
+        report.append(entry)
+
+    changed = []
+    for keywords in chunked(valid, chunk_size):
+        existing = {
+            keyword: (account_name, industry)
+            for keyword, account_name, industry in db.session.query(
+                KeywordData.keyword, KeywordData.account_name, KeywordData.industry
+            ).filter(KeywordData.keyword.in_(keywords))
+        }
+        for keyword in keywords:
+            entry, row = valid[keyword]
+            current = existing.get(keyword)
+            if current is None:
+                entry["status"] = "created"
+            elif current == (row["account_name"], row["industry"]):
+                entry["status"] = "unchanged"
+                continue
+            else:
+                entry["status"] = "updated"
+            changed.append(row)
+
+    if not dry_run and changed:
+        table = KeywordData.__table__
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["keyword"],
+            set_={"account_name": stmt.excluded.account_name, "industry": stmt.excluded.industry},
+        )
+        try:
+            for chunk in chunked(changed, chunk_size):
+                db.session.execute(stmt, chunk)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    counts = Counter(entry["status"] for entry in report)
+    summary = {status: counts[status] for status in IMPORT_STATUSES}
+    summary["dry_run"] = dry_run
+    summary["rows"] = report
+    return summary
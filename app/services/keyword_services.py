@@ -1,10 +1,46 @@
-from datetime import datetime
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from app import db
-from app.models.db_models import KeywordData, SubredditData
-from app.utils import get_reddit
+from app.metrics import (
+    CACHE_REQUESTS, REDDIT_CALL_SECONDS, REDDIT_CALLS, current_endpoint, keyword_label, record_reddit_limits
+)
+from app.models.db_models import KeywordData, KeywordPost, PostData
+from app.services.cache import keyword_cache
+from app.services.reddit_clients import reddit_clients
+from app.services.rollup_services import record_new_posts
+from app.services.singleflight import fetch_lease, keyword_flights, renew_leases, wait_for_lease
+from app.storage import dialect_insert
 
-# this layer handles interactions with the database, encapsulating the logic 
-# for adding and fetching KeywordData and SubredditData.
+# this layer handles interactions with the database, encapsulating the logic
+# for adding and fetching KeywordData and the posts stored for each keyword
+# (PostData, linked through KeywordPost).
+
+# Subreddit names: 2-21 letters, digits or underscores, not starting with an underscore
+SUBREDDIT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_]{1,20}$")
+MAX_NAME_LENGTH = 100  # KeywordData.account_name and industry
+
+
+def validate_keyword_row(row):
+    # Error message for a keyword that can't be registered, or None. Used by the bulk
+    # import and the batch endpoint.
+    if not row["keyword"]:
+        return "missing keyword"
+    if not SUBREDDIT_NAME.match(row["keyword"]):
+        return "not a valid subreddit name (2-21 letters, digits or underscores, not starting with _)"
+    for name in ("account_name", "industry"):
+        if not row[name]:
+            return "missing %s" % name
+        if len(row[name]) > MAX_NAME_LENGTH:
+            return "%s is longer than %d characters" % (name, MAX_NAME_LENGTH)
+    return None
 
 
 def add_keyword_data(keyword, account_name=None, industry=None):
@@ -14,26 +50,577 @@ def add_keyword_data(keyword, account_name=None, industry=None):
     return keyword_data
 
 
-def get_subreddit_data_by_keyword(keyword):
+def get_or_create_keyword_data(keyword, account_name=None, industry=None):
     keyword_data = KeywordData.query.filter_by(keyword=keyword).first()
     if keyword_data:
-        return SubredditData.query.filter_by(keyword_data_id=keyword_data.id).all()
-    return None
+        return keyword_data
+    try:
+        return add_keyword_data(keyword, account_name, industry)
+    except IntegrityError:
+        # lost the race to another request registering the same keyword
+        db.session.rollback()
+        keyword_data = KeywordData.query.filter_by(keyword=keyword).first()
+        if keyword_data is None:
+            raise
+        return keyword_data
+
 
+def serialize_subreddit_data(subreddit_data_list):
+    return [
+        {
+            "subreddit": row.subreddit,
+            "comment": row.comment,
+            "created_date": row.created_date,
+            "author": row.author,
+            "title": row.title,
+            "keyword_data_id": row.keyword_data_id,
+        }
+        for row in subreddit_data_list
+    ]
 
-def fetch_and_store_reddit_data(keyword, keyword_data_id):
-    reddit = get_reddit()
-    subreddit_data_list = []
-    for submission in reddit.subreddit(keyword).hot(limit=10):
-        subreddit_data = SubredditData(
-            subreddit=submission.subreddit.display_name,
-            comment=submission.selftext or "No comments",
-            created_date=datetime.utcfromtimestamp(submission.created_utc),
-            author=submission.author.name if submission.author else "Unknown",
-            title=submission.title,
-            keyword_data_id=keyword_data_id
+
+def is_stale(last_fetched):
+    if last_fetched is None:
+        return True
+    return datetime.utcnow() - last_fetched > timedelta(seconds=current_app.config["KEYWORD_CACHE_TTL"])
+
+
+def keyword_version_query(keyword):
+    # the queries below are plain selects so the async path (app/asgi.py) runs the same SQL
+    return select(
+        KeywordData.id, KeywordData.data_version, KeywordData.data_modified, KeywordData.last_fetched
+    ).where(KeywordData.keyword == keyword)
+
+
+def keyword_posts_query(keyword):
+    # One round trip: the keyword row outer-joined to its posts
+    return (
+        select(
+            KeywordData.last_fetched,
+            KeywordData.data_version,
+            PostData.subreddit,
+            PostData.comment,
+            PostData.created_date,
+            PostData.author,
+            PostData.title,
+            KeywordPost.keyword_data_id,
         )
-        subreddit_data_list.append(subreddit_data)
-    db.session.add_all(subreddit_data_list)
-    db.session.commit()
+        .outerjoin(KeywordPost, KeywordPost.keyword_data_id == KeywordData.id)
+        .outerjoin(PostData, PostData.id == KeywordPost.post_id)
+        .where(KeywordData.keyword == keyword)
+    )
+
+
+def get_keyword_version(keyword):
+    # Reads keyword_data alone, so conditional GETs can be answered without loading
+    # posts. Returns (id, data_version, data_modified, last_fetched), or None for a
+    # keyword that is unknown or has never been fetched.
+    version = db.session.execute(keyword_version_query(keyword)).first()
+    if version is None or version.last_fetched is None:
+        return None
+    if is_stale(version.last_fetched) and current_app.config["INGESTION_MODE"] == "inline":
+        schedule_refresh(keyword)
+    return version
+
+
+def bump_keyword_versions(keyword_data_ids, modified):
+    # new /keyword_data ETags for keywords whose posts changed, in one UPDATE
+    if not keyword_data_ids:
+        return
+    KeywordData.query.filter(KeywordData.id.in_(keyword_data_ids)).update(
+        {
+            "data_version": db.func.coalesce(KeywordData.data_version, 0) + 1,
+            "data_modified": modified,
+        },
+        synchronize_session=False,
+    )
+
+
+def get_subreddit_data_by_keyword(keyword, data_version=None):
+    # Serve from the in-process LRU, falling back to the db. Stale results are still
+    # returned right away; a single background refresh brings them up to date. Passing
+    # the keyword's current data_version also reloads entries cached before another
+    # process (e.g. the ingestion worker) stored newer posts.
+    cached = cached_keyword_posts(keyword, data_version)
+    if cached is not None:
+        subreddit_data_list, last_fetched, _ = cached
+    else:
+        cached = cache_keyword_posts(keyword, db.session.execute(keyword_posts_query(keyword)).all())
+        if cached is None:
+            return None
+        subreddit_data_list, last_fetched, _ = cached
+
+    # in worker mode the ingestion worker owns refreshes and the API only reads
+    if is_stale(last_fetched) and current_app.config["INGESTION_MODE"] == "inline":
+        schedule_refresh(keyword)
     return subreddit_data_list
+
+
+def cached_keyword_posts(keyword, data_version=None):
+    # keyword_cache entry still current for `data_version`, or None
+    cached = keyword_cache.get(keyword)
+    if cached is not None and data_version is not None and cached[2] != data_version:
+        cached = None
+    CACHE_REQUESTS.inc(result="miss" if cached is None else "hit")
+    return cached
+
+
+def cache_keyword_posts(keyword, rows):
+    # Caches the rows of keyword_posts_query as (posts, last_fetched, data_version), or
+    # returns None for a keyword that is unknown or registered but never fetched
+    last_fetched = rows[0].last_fetched if rows else None
+    if last_fetched is None and (not rows or rows[0].keyword_data_id is None):
+        return None
+    cached = (
+        serialize_subreddit_data(row for row in rows if row.keyword_data_id is not None),
+        last_fetched,
+        rows[0].data_version or 0,
+    )
+    keyword_cache.set(keyword, cached)
+    return cached
+
+
+_request_counts = Counter()
+_request_counts_lock = threading.Lock()
+_request_counts_flushed_at = time.monotonic()
+
+
+def record_keyword_request(keyword):
+    # Reads are counted in memory and written in one batch every
+    # REQUEST_COUNT_FLUSH_INTERVAL seconds rather than with a write per request
+    if count_keyword_request(keyword):
+        flush_keyword_requests()
+
+
+def count_keyword_request(keyword):
+    # Counts one read; True when the counts are due to be flushed
+    with _request_counts_lock:
+        _request_counts[keyword] += 1
+        return time.monotonic() - _request_counts_flushed_at >= current_app.config["REQUEST_COUNT_FLUSH_INTERVAL"]
+
+
+def flush_keyword_requests():
+    global _request_counts_flushed_at
+    with _request_counts_lock:
+        counts = dict(_request_counts)
+        _request_counts.clear()
+        _request_counts_flushed_at = time.monotonic()
+    if not counts:
+        return
+    now = datetime.utcnow()
+    for keyword, count in counts.items():
+        KeywordData.query.filter_by(keyword=keyword).update(
+            {
+                "request_count": db.func.coalesce(KeywordData.request_count, 0) + count,
+                "last_requested": now,
+            },
+            synchronize_session=False,
+        )
+    db.session.commit()
+
+
+_refresh_lock = threading.Lock()
+_refreshing = set()
+_refresh_failed_at = {}
+_refresh_executor = None
+
+
+def schedule_refresh(keyword):
+    # At most one refresh per keyword is in flight; failed refreshes back off for
+    # KEYWORD_REFRESH_RETRY seconds so an unreachable Reddit isn't hit on every read
+    global _refresh_executor
+    config = current_app.config
+    with _refresh_lock:
+        if keyword in _refreshing:
+            return False
+        failed_at = _refresh_failed_at.get(keyword)
+        if failed_at is not None and time.monotonic() - failed_at < config["KEYWORD_REFRESH_RETRY"]:
+            return False
+        _refreshing.add(keyword)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=config["KEYWORD_REFRESH_WORKERS"], thread_name_prefix="keyword-refresh"
+            )
+    _refresh_executor.submit(_refresh_keyword, current_app._get_current_object(), keyword)
+    return True
+
+
+def _refresh_keyword(app, keyword):
+    try:
+        with app.app_context():
+            keyword_data = KeywordData.query.filter_by(keyword=keyword).first()
+            with fetch_lease("keyword:" + keyword) as acquired:
+                # without the lease another process is already refreshing this keyword
+                if keyword_data and acquired:
+                    fetch_and_store_reddit_data(keyword, keyword_data.id)
+            db.session.remove()
+        _refresh_failed_at.pop(keyword, None)
+    except Exception:
+        app.logger.exception("Background refresh failed for keyword %r", keyword)
+        _refresh_failed_at[keyword] = time.monotonic()
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(keyword)
+
+
+LISTINGS = ("new", "hot", "rising", "top", "controversial")
+TIME_FILTERS = ("hour", "day", "week", "month", "year", "all")
+
+
+def listing_arguments(listing, time_filter, limit):
+    # Keyword arguments for the subreddit listing method named `listing`
+    if listing not in LISTINGS:
+        raise ValueError("Unknown listing %r, expected one of %s" % (listing, ", ".join(LISTINGS)))
+    if listing in ("top", "controversial"):
+        if time_filter not in TIME_FILTERS:
+            raise ValueError("Unknown time filter %r, expected one of %s" % (time_filter, ", ".join(TIME_FILTERS)))
+        return {"time_filter": time_filter, "limit": limit}
+    return {"limit": limit}
+
+
+def listing_iterator(reddit, keyword, listing, time_filter, limit):
+    arguments = listing_arguments(listing, time_filter, limit)
+    return getattr(reddit.subreddit(keyword), listing)(**arguments)
+
+
+def listing_specs(listings=None):
+    # (listing, time_filter, limit) per entry of `listings`, default REDDIT_LISTINGS;
+    # a None limit means the default depth for the fetch
+    config = current_app.config
+    specs = []
+    for spec in listings or config["REDDIT_LISTINGS"]:
+        listing = spec.get("listing", "new")
+        limit = spec.get("limit")
+        if limit is None and listing != "new":
+            limit = config["REDDIT_FETCH_LIMIT"]
+        specs.append((listing, spec.get("time_filter", "all"), limit))
+    return specs
+
+
+def submission_row(submission, created_date):
+    return {
+        "reddit_id": submission.fullname,
+        "subreddit": submission.subreddit.display_name,
+        "comment": submission.selftext or "No comments",
+        "created_date": created_date,
+        "author": submission.author.name if submission.author else "Unknown",
+        "title": submission.title,
+    }
+
+
+def iter_reddit_submissions(reddit, keyword, listing="new", time_filter="all", limit=None, rate_limiter=None,
+                            before=None):
+    # Network-only half of the fetch: touches no db state, so it can run off the request thread.
+    # Yields post dicts as praw pages through the listing (100 per request), so callers
+    # can write them out as they arrive. On /new, paging stops at `before` (a
+    # (fullname, created_date) high-water mark), so a refresh only costs the pages
+    # holding unseen posts; ranked listings are read to `limit`.
+    if limit is None:
+        config = current_app.config
+        limit = config["REDDIT_FETCH_LIMIT"] if before is None else config["REDDIT_REFRESH_DEPTH"]
+    before_fullname, before_created = (before or (None, None)) if listing == "new" else (None, None)
+    label = keyword_label(keyword)
+    outcome = "error"
+    waited = 0.0  # time spent in Reddit calls only, not in the consumer
+    try:
+        submissions = iter(listing_iterator(reddit, keyword, listing, time_filter, limit))
+        index = 0
+        while True:
+            if rate_limiter is not None and index % 100 == 0 and index < limit:
+                rate_limiter.acquire()  # one listing page per 100 submissions
+            started = time.perf_counter()
+            submission = next(submissions, None)
+            waited += time.perf_counter() - started
+            if submission is None:
+                break
+            index += 1
+            created_date = datetime.utcfromtimestamp(submission.created_utc)
+            if submission.fullname == before_fullname or (before_created and created_date < before_created):
+                break
+            yield submission_row(submission, created_date)
+        outcome = "ok"
+    finally:
+        REDDIT_CALL_SECONDS.observe(waited, endpoint=current_endpoint(), keyword=label)
+        REDDIT_CALLS.inc(keyword=label, outcome=outcome)
+        record_reddit_limits(reddit, getattr(getattr(reddit, "config", None), "client_id", "default"))
+
+
+def fetch_reddit_submissions(reddit, keyword, limit=None, rate_limiter=None, before=None):
+    # The newest posts of a keyword as one list, for callers that need them all at once
+    return list(iter_reddit_submissions(reddit, keyword, limit=limit, rate_limiter=rate_limiter, before=before))
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def content_hash(row):
+    # covers the fields a re-fetch can change; subreddit and created_date never do
+    text = "\0".join((row["title"], row["comment"], row["author"]))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def store_posts(rows):
+    # Stores post dicts (each with the keyword_data_id that fetched it). A post is
+    # written once however many keywords fetch it: new posts are inserted, posts whose
+    # content_hash changed are updated, unchanged ones are not written at all. Then each
+    # keyword gets a KeywordPost link. Posts this call inserted and links it made are
+    # added to the /stats rollups, all in the caller's transaction. Returns how many posts
+    # were written or newly linked, 0 when the rows changed nothing.
+    if not rows:
+        return 0
+    posts = {row["reddit_id"]: row for row in rows}
+    hashes = {reddit_id: content_hash(row) for reddit_id, row in posts.items()}
+    stored = {
+        reddit_id: (post_id, stored_hash)
+        for post_id, reddit_id, stored_hash in db.session.query(
+            PostData.id, PostData.reddit_id, PostData.content_hash
+        ).filter(PostData.reddit_id.in_(posts))
+    }
+    writes = {
+        reddit_id: {
+            "reddit_id": reddit_id,
+            "subreddit": row["subreddit"],
+            "comment": row["comment"],
+            "created_date": row["created_date"],
+            "author": row["author"],
+            "title": row["title"],
+            "content_hash": hashes[reddit_id],
+        }
+        for reddit_id, row in posts.items()
+        if reddit_id not in stored or stored[reddit_id][1] != hashes[reddit_id]
+    }
+    changed_ids = [
+        stored[reddit_id][0] for reddit_id in posts
+        if reddit_id in stored and stored[reddit_id][1] != hashes[reddit_id]
+    ]
+    table = PostData.__table__
+    new_ids = [reddit_id for reddit_id in posts if reddit_id not in stored]
+    inserted = set()
+    if new_ids:
+        # RETURNING gives exactly the posts this insert wrote, so one that another writer
+        # stores at the same time is added to the rollups by only one of them
+        inserted = set(db.session.execute(
+            dialect_insert(table).on_conflict_do_nothing(index_elements=["reddit_id"]).returning(table.c.reddit_id),
+            [writes[reddit_id] for reddit_id in new_ids],
+        ).scalars())
+    # changed posts, and new ones another writer inserted first
+    updates = [write for reddit_id, write in writes.items() if reddit_id not in inserted]
+    if updates:
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["reddit_id"],
+            set_={
+                "comment": stmt.excluded.comment,
+                "author": stmt.excluded.author,
+                "title": stmt.excluded.title,
+                "content_hash": stmt.excluded.content_hash,
+            },
+            # another writer may have stored the same content since the lookup
+            where=table.c.content_hash.is_distinct_from(stmt.excluded.content_hash),
+        )
+        db.session.execute(stmt, updates)
+    if new_ids:
+        stored.update(
+            (reddit_id, (post_id, None))
+            for post_id, reddit_id in db.session.query(PostData.id, PostData.reddit_id).filter(
+                PostData.reddit_id.in_(new_ids)
+            )
+        )
+
+    links = {(row["keyword_data_id"], stored[row["reddit_id"]][0]): row for row in rows}
+    linked = set(
+        db.session.query(KeywordPost.keyword_data_id, KeywordPost.post_id)
+        .filter(KeywordPost.post_id.in_({post_id for _, post_id in links}))
+        .tuples()
+    )
+    new_links = [(key, row) for key, row in links.items() if key not in linked]
+    if new_links:
+        db.session.execute(
+            dialect_insert(KeywordPost.__table__).on_conflict_do_nothing(
+                index_elements=["keyword_data_id", "post_id"]
+            ),
+            [
+                {"keyword_data_id": keyword_data_id, "post_id": post_id, "created_date": row["created_date"]}
+                for (keyword_data_id, post_id), row in new_links
+            ],
+        )
+    record_new_posts([row for _, row in new_links], [posts[reddit_id] for reddit_id in inserted])
+
+    if changed_ids:
+        # a rewritten post also changes the responses of the other keywords linking it;
+        # the keywords in `rows` are left to the caller
+        other_keywords = (
+            db.session.query(KeywordPost.keyword_data_id)
+            .filter(
+                KeywordPost.post_id.in_(changed_ids),
+                KeywordPost.keyword_data_id.notin_({row["keyword_data_id"] for row in rows}),
+            )
+            .distinct()
+        )
+        bump_keyword_versions([keyword_data_id for (keyword_data_id,) in other_keywords], datetime.utcnow())
+    return len(writes) + len(new_links)
+
+
+def get_keyword_cursor(keyword_data):
+    if not keyword_data.newest_fullname:
+        return None
+    created_date = (
+        db.session.query(PostData.created_date)
+        .filter_by(reddit_id=keyword_data.newest_fullname)
+        .scalar()
+    )
+    return keyword_data.newest_fullname, created_date
+
+
+def fetch_and_store_reddit_data(keyword, keyword_data_id, listings=None):
+    # Streams each listing (default REDDIT_LISTINGS, e.g. [{"listing": "top",
+    # "time_filter": "week", "limit": 1000}]) straight into the db, committing every
+    # INGEST_CHUNK_SIZE posts, so memory stays flat however deep the fetch goes and the
+    # chunks written before a failure are kept. The /new cursor only moves once every
+    # listing is done, so a failed run is retried from the same point (re-stored posts
+    # are upserts). Returns the number of posts stored.
+    config = current_app.config
+    before = get_keyword_cursor(db.session.get(KeywordData, keyword_data_id))
+    newest_fullname = None
+    stored = 0
+    for listing, time_filter, limit in listing_specs(listings):
+        with reddit_clients.client() as client:
+            submissions = iter_reddit_submissions(
+                client.reddit,
+                keyword,
+                listing=listing,
+                time_filter=time_filter,
+                limit=limit,
+                rate_limiter=client.rate_limiter,
+                before=before,
+            )
+            for chunk in chunked(submissions, config["INGEST_CHUNK_SIZE"]):
+                if listing == "new" and newest_fullname is None:
+                    newest_fullname = chunk[0]["reddit_id"]
+                stored += store_fetched_chunk(keyword, keyword_data_id, chunk)
+
+    finish_fetch(keyword, keyword_data_id, newest_fullname)
+    return stored
+
+
+def store_fetched_chunk(keyword, keyword_data_id, chunk):
+    # Stores and commits one chunk of a keyword's fetch; returns the posts in it. A post
+    # can show up twice while a listing shifts under the pager. Renews the fetch's lease,
+    # which would otherwise expire under a fetch longer than FETCH_LEASE_TTL.
+    renew_leases()
+    rows = list({row["reddit_id"]: dict(row, keyword_data_id=keyword_data_id) for row in chunk}.values())
+    if store_posts(rows):
+        # only a change to the keyword's posts gives /keyword_data a new ETag
+        bump_keyword_versions([keyword_data_id], datetime.utcnow())
+    db.session.commit()
+    keyword_cache.pop(keyword)
+    return len(rows)
+
+
+def finish_fetch(keyword, keyword_data_id, newest_fullname):
+    # Marks the keyword fetched and moves its /new cursor once every listing is stored
+    values = {"last_fetched": datetime.utcnow()}
+    if newest_fullname is not None:
+        values["newest_fullname"] = newest_fullname
+    KeywordData.query.filter_by(id=keyword_data_id).update(values, synchronize_session=False)
+    db.session.commit()
+    keyword_cache.pop(keyword)
+
+
+def fetch_cold_keyword(keyword, account_name=None, industry=None):
+    # First fetch of a keyword. Concurrent callers in this process share one fetch;
+    # other processes wait on the db lease and then read what the leader stored.
+    return keyword_flights.do(keyword, lambda: _fetch_cold_keyword(keyword, account_name, industry))
+
+
+def _fetch_cold_keyword(keyword, account_name, industry):
+    keyword_data = get_or_create_keyword_data(keyword, account_name, industry)
+    while True:
+        with fetch_lease("keyword:" + keyword) as acquired:
+            if acquired:
+                fetch_and_store_reddit_data(keyword, keyword_data.id)
+                return get_subreddit_data_by_keyword(keyword)
+        wait_for_lease("keyword:" + keyword)
+        db.session.refresh(keyword_data)
+        if keyword_data.last_fetched is not None:
+            keyword_cache.pop(keyword)
+            return get_subreddit_data_by_keyword(keyword)
+        # the other process gave up without fetching; try to take over
+
+
+def register_keywords(keywords, account_name, industry):
+    # INSERT .. ON CONFLICT (keyword) DO NOTHING, so a keyword registered concurrently by
+    # another request is kept rather than failing the batch
+    if not keywords:
+        return
+    stmt = dialect_insert(KeywordData.__table__).on_conflict_do_nothing(index_elements=["keyword"])
+    db.session.execute(stmt, [
+        {"keyword": keyword, "account_name": account_name, "industry": industry} for keyword in keywords
+    ])
+    db.session.commit()
+
+
+def _fetch_batch_keyword(app, keyword, account_name, industry):
+    # Runs on the batch pool in its own app context. Goes through fetch_cold_keyword, so
+    # it shares the fetch with concurrent /keyword_data callers, holds the keyword's lease
+    # while fetching and commits as it goes. Returns the number of posts stored.
+    with app.app_context():
+        return len(fetch_cold_keyword(keyword, account_name, industry) or [])
+
+
+def fetch_keywords_batch(keywords, account_name=None, industry=None):
+    # Fetch every keyword that has no stored data yet through a bounded worker pool, each
+    # one committed on its own, so a failure loses only that keyword. Keywords that are
+    # not subreddit names, or new ones without a valid account_name and industry, are
+    # reported invalid and never sent to Reddit. Returns one status dict per keyword.
+    keywords = list(dict.fromkeys(keywords))
+    existing = {k.keyword: k for k in KeywordData.query.filter(KeywordData.keyword.in_(keywords))}
+    cached_ids = {
+        keyword_data_id
+        for (keyword_data_id,) in db.session.query(KeywordPost.keyword_data_id)
+        .filter(KeywordPost.keyword_data_id.in_([k.id for k in existing.values()]))
+        .distinct()
+    }
+
+    results = {}
+    pending = []
+    for keyword in keywords:
+        keyword_data = existing.get(keyword) or KeywordData(account_name=account_name, industry=industry)
+        error = validate_keyword_row(
+            {"keyword": keyword, "account_name": keyword_data.account_name, "industry": keyword_data.industry}
+        )
+        if error is not None:
+            results[keyword] = {"keyword": keyword, "status": "invalid", "error": error}
+        elif keyword_data.id in cached_ids:
+            results[keyword] = {"keyword": keyword, "status": "cached"}
+        else:
+            pending.append(keyword)
+
+    register_keywords([keyword for keyword in pending if keyword not in existing], account_name, industry)
+    if pending and current_app.config["INGESTION_MODE"] == "worker":
+        # only registered; the ingestion worker fetches never-fetched keywords first
+        for keyword in pending:
+            results[keyword] = {"keyword": keyword, "status": "queued"}
+    elif pending:
+        app = current_app._get_current_object()
+        max_workers = min(current_app.config["BATCH_MAX_WORKERS"], len(pending))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                keyword: executor.submit(_fetch_batch_keyword, app, keyword, account_name, industry)
+                for keyword in pending
+            }
+        for keyword, future in futures.items():
+            try:
+                results[keyword] = {"keyword": keyword, "status": "fetched", "count": future.result()}
+            except Exception as exc:
+                results[keyword] = {"keyword": keyword, "status": "error", "error": str(exc)}
+
+    return [results[keyword] for keyword in keywords]
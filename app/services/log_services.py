@@ -0,0 +1,57 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+from app import db
+from app.models.db_models import PRAWLogData
+
+# Read side of the PRAW log table: keyset pagination on (timestamp, id), newest first.
+
+
+def encode_cursor(timestamp, log_id):
+    raw = "%s|%d" % (timestamp.isoformat(), log_id)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def praw_logs_query(since=None, until=None, level=None, cursor=None):
+    # Column-only query (no ORM hydration) ordered to match the (timestamp, id) index
+    query = db.session.query(
+        PRAWLogData.id, PRAWLogData.log, PRAWLogData.level, PRAWLogData.timestamp
+    )
+    if since is not None:
+        query = query.filter(PRAWLogData.timestamp >= since)
+    if until is not None:
+        query = query.filter(PRAWLogData.timestamp < until)
+    if level:
+        query = query.filter(PRAWLogData.level == level.upper())
+    if cursor:
+        timestamp, log_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                PRAWLogData.timestamp < timestamp,
+                and_(PRAWLogData.timestamp == timestamp, PRAWLogData.id < log_id),
+            )
+        )
+    return query.order_by(PRAWLogData.timestamp.desc(), PRAWLogData.id.desc())
+
+
+def get_praw_logs_page(limit, **filters):
+    # Returns (rows, next_cursor); next_cursor is None on the last page
+    rows = praw_logs_query(**filters).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+
+def iter_praw_logs(batch_size=1000, **filters):
+    # Streams rows straight off the cursor in batches, so memory stays flat
+    # regardless of table size
+    return praw_logs_query(**filters).yield_per(batch_size)
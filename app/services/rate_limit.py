@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Client-side token buckets that keep concurrent fetches under Reddit's OAuth quota.
+# Each pooled Reddit client owns one, shared by every thread and coroutine using that
+# credential set. Every Reddit request takes a token first, so a RequestBudget made
+# active with spending() counts, and caps, the requests made under it.
+
+
+class RequestBudgetExceeded(Exception):
+    pass
+
+
+class RequestBudget:
+    # Reddit requests a piece of work (e.g. one ingestion cycle) may make, across every
+    # client and thread that runs under it
+    def __init__(self, requests):
+        self.remaining = requests
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def spend(self, tokens):
+        with self.lock:
+            if tokens > self.remaining:
+                raise RequestBudgetExceeded("Reddit request budget spent (%d used)" % self.used)
+            self.remaining -= tokens
+            self.used += tokens
+
+
+_budget = contextvars.ContextVar("request_budget", default=None)
+
+
+@contextmanager
+def spending(budget):
+    # Charges the tokens taken in this context (and contexts copied from it) to `budget`
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def _charge(tokens):
+    budget = _budget.get()
+    if budget is not None:
+        budget.spend(tokens)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)  # tokens added per second
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self, tokens):
+        # Takes `tokens` and returns 0, or returns the seconds until they are available
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        # Block until `tokens` are available; returns False if `timeout` expires first.
+        # Raises RequestBudgetExceeded if the active budget can't cover them.
+        _charge(tokens)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        # acquire() for coroutines: waits without blocking the event loop
+        _charge(tokens)
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return True
+            await asyncio.sleep(wait)
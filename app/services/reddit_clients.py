@@ -0,0 +1,192 @@
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from app.services.rate_limit import TokenBucket
+
+# Pool of Reddit clients, one per credential set (OAuth app). Each fetch borrows the
+# client with the most quota headroom, judged from the X-Ratelimit-* headers prawcore
+# records on every response, so adding credential sets adds throughput. The pool is
+# replaced as a whole: in-flight fetches finish on the clients they borrowed while new
+# fetches see the new set. The async serving mode (app/asgi.py) borrows the same clients
+# through async_client(); each then also holds an asyncpraw session, sharing the
+# credential set's token bucket and quota accounting with its praw session.
+
+
+class RedditClient:
+    def __init__(self, reddit, client_id, rate_limiter, window_quota=1000, credentials_key=None, async_reddit=None):
+        self.reddit = reddit
+        self.client_id = client_id
+        self.rate_limiter = rate_limiter
+        self.window_quota = window_quota
+        self.credentials_key = credentials_key
+        self.in_flight = 0
+        # asyncpraw.Reddit, built on first async use: its HTTP session belongs to the
+        # event loop that uses it
+        self.async_reddit = async_reddit
+
+    def limits(self):
+        # the praw and asyncpraw sessions each see the quota; trust the lower report
+        limits = getattr(getattr(self.reddit, "auth", None), "limits", None) or {}
+        async_limits = getattr(getattr(self.async_reddit, "auth", None), "limits", None) or {}
+        if async_limits.get("remaining") is not None and (
+            limits.get("remaining") is None or async_limits["remaining"] < limits["remaining"]
+        ):
+            return async_limits
+        return limits
+
+    def headroom(self):
+        # Requests left in the current rate-limit window, less fetches already running.
+        # Before the first response, or once the window has reset, assume a full window.
+        limits = self.limits()
+        remaining = limits.get("remaining")
+        reset_timestamp = limits.get("reset_timestamp")
+        if remaining is None or (reset_timestamp is not None and reset_timestamp <= time.time()):
+            remaining = self.window_quota
+        return remaining - self.in_flight
+
+    def status(self):
+        limits = self.limits()
+        return {
+            "client_id": self.client_id,
+            "remaining": limits.get("remaining"),
+            "used": limits.get("used"),
+            "reset_timestamp": limits.get("reset_timestamp"),
+            "in_flight": self.in_flight,
+        }
+
+
+def _build_async_reddit(credentials_key):
+    import asyncpraw
+
+    client_id, client_secret, user_agent = credentials_key
+    return asyncpraw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent)
+
+
+def _credentials_key(credentials):
+    return credentials["client_id"], credentials["client_secret"], credentials["user_agent"]
+
+
+class RedditClientManager:
+    def __init__(self):
+        self._credentials = []
+        self._clients = None  # built on first use
+        self._settings = {}
+        self._lock = threading.Lock()
+        self._retired = []  # swapped-out clients whose asyncpraw sessions are still open
+
+    def configure(self, credentials, rate, burst, window_quota):
+        # Sets the credential sets and per-client limits; clients are created lazily
+        with self._lock:
+            self._settings = {"rate": rate, "burst": burst, "window_quota": window_quota}
+            self._credentials = [dict(item) for item in credentials]
+            self._clients = None
+
+    def set_credentials(self, credentials):
+        # Atomically swaps in clients for `credentials`. Credential sets already in the
+        # pool keep their client, quota state and token bucket.
+        credentials = [dict(item) for item in credentials]
+        if not credentials:
+            raise ValueError("At least one credential set is required")
+        with self._lock:
+            existing = {client.credentials_key: client for client in self._clients or ()}
+            clients = tuple(existing.get(_credentials_key(item)) or self._build(item) for item in credentials)
+            self._retire(client for client in existing.values() if client not in clients)
+            self._credentials = credentials
+            self._clients = clients
+
+    def replace(self, clients):
+        # Installs prebuilt RedditClient objects, e.g. a fake backend for benchmarks
+        with self._lock:
+            self._retire(self._clients or ())
+            self._clients = tuple(clients)
+
+    def _retire(self, clients):
+        # asyncpraw sessions have to be closed from their event loop; async_client() and
+        # aclose() do that once the client is idle
+        self._retired.extend(client for client in clients if client.async_reddit is not None)
+
+    def _build(self, credentials):
+        import praw
+
+        reddit = praw.Reddit(
+            client_id=credentials["client_id"],
+            client_secret=credentials["client_secret"],
+            user_agent=credentials["user_agent"],
+        )
+        return RedditClient(
+            reddit,
+            credentials["client_id"],
+            TokenBucket(self._settings["rate"], self._settings["burst"]),
+            self._settings["window_quota"],
+            _credentials_key(credentials),
+        )
+
+    def clients(self):
+        clients = self._clients
+        if clients is None:
+            with self._lock:
+                if self._clients is None:
+                    self._clients = tuple(self._build(item) for item in self._credentials)
+                clients = self._clients
+        return clients
+
+    def __len__(self):
+        return len(self._credentials) if self._clients is None else len(self._clients)
+
+    @contextmanager
+    def client(self):
+        # Borrows the client with the most headroom for one fetch
+        clients = self.clients()
+        if not clients:
+            raise RuntimeError("No Reddit credentials configured")
+        with self._lock:
+            client = max(clients, key=RedditClient.headroom)
+            client.in_flight += 1
+        try:
+            yield client
+        finally:
+            with self._lock:
+                client.in_flight -= 1
+
+    @asynccontextmanager
+    async def async_client(self):
+        # client() for coroutines; the borrowed client's async_reddit is ready to use
+        clients = self.clients()
+        if not clients:
+            raise RuntimeError("No Reddit credentials configured")
+        with self._lock:
+            client = max(clients, key=RedditClient.headroom)
+            client.in_flight += 1
+            if client.async_reddit is None:
+                if client.credentials_key is None:
+                    client.in_flight -= 1
+                    raise RuntimeError("Reddit client %s has no async session" % client.client_id)
+                client.async_reddit = _build_async_reddit(client.credentials_key)
+        try:
+            yield client
+        finally:
+            with self._lock:
+                client.in_flight -= 1
+            await self._close_retired()
+
+    async def _close_retired(self, idle_only=True):
+        with self._lock:
+            closing = [client for client in self._retired if client.in_flight == 0 or not idle_only]
+            self._retired = [client for client in self._retired if client not in closing]
+        for client in closing:
+            await client.async_reddit.close()
+
+    async def aclose(self):
+        # Closes every asyncpraw session, on the event loop's shutdown
+        with self._lock:
+            self._retire(self._clients or ())
+        await self._close_retired(idle_only=False)
+        with self._lock:
+            for client in self._clients or ():
+                client.async_reddit = None
+
+    def status(self):
+        return [client.status() for client in self.clients()]
+
+
+reddit_clients = RedditClientManager()
@@ -0,0 +1,193 @@
+import gzip
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, text, tuple_
+from app import db
+from app.models.db_models import CommentData, IngestionJob, KeywordPost, PRAWLogData, PostData
+from app.serialization import dumps
+from app.services.keyword_services import bump_keyword_versions
+from app.services.shared_state import invalidate_caches
+from app.services.singleflight import fetch_lease
+
+# Retention and compaction. Expired rows are appended to gzipped NDJSON archives
+# partitioned by day, then deleted in small batches (one short transaction each), and
+# SQLite returns the freed pages with incremental_vacuum. A batch is archived before it
+# is deleted, so a crash in between can only duplicate rows in the archive, never lose
+# them.
+
+# table name -> (model, column that ages a row)
+RETENTION_TABLES = {
+    "praw_log_data": (PRAWLogData, "timestamp"),
+    "ingestion_job": (IngestionJob, "started_at"),
+    "post_data": (PostData, "created_date"),
+    "comment_data": (CommentData, "created_date"),
+}
+
+
+def expired_condition(model, age_column, max_age_days=None, max_rows=None, now=None):
+    # SQL condition matching rows past either limit, or None if nothing is expired
+    age = getattr(model, age_column)
+    conditions = []
+    if max_age_days is not None:
+        conditions.append(age < (now or datetime.utcnow()) - timedelta(days=max_age_days))
+    if max_rows is not None:
+        # the newest max_rows rows by (age, id) are kept; everything from the next one down goes
+        boundary = (
+            db.session.query(age, model.id)
+            .order_by(age.desc(), model.id.desc())
+            .offset(max_rows)
+            .first()
+        )
+        if boundary is not None:
+            conditions.append(tuple_(age, model.id) <= tuple_(*boundary))
+    if not conditions:
+        return None
+    return or_(*conditions)
+
+
+def archive_rows(archive_dir, table_name, age_column, rows):
+    # Appends each row to <archive_dir>/<table>/<YYYY-MM-DD>.ndjson.gz by its age column.
+    # Every append is a new gzip member; gzip readers treat the file as one stream.
+    partitions = defaultdict(list)
+    for row in rows:
+        day = row[age_column].strftime("%Y-%m-%d") if row[age_column] else "undated"
+        partitions[day].append(row)
+    directory = os.path.join(archive_dir, table_name)
+    os.makedirs(directory, exist_ok=True)
+    for day, partition in partitions.items():
+        with open(os.path.join(directory, "%s.ndjson.gz" % day), "ab") as archive:
+            archive.write(gzip.compress(b"".join(dumps(dict(row)) + b"\n" for row in partition)))
+            archive.flush()
+            os.fsync(archive.fileno())
+
+
+def apply_retention(table_name, policy, archive_dir, batch_size, pause=0.0, dry_run=False):
+    # Archives then deletes one table's expired rows, oldest first. Expired posts take
+    # their keyword links and comments with them. Returns {"expired": n, "archived": n,
+    # "deleted": n}, plus "comments_deleted" for post_data.
+    model, age_column = RETENTION_TABLES[table_name]
+    table = model.__table__
+    condition = expired_condition(model, age_column, policy.get("max_age_days"), policy.get("max_rows"))
+    report = {"expired": 0, "archived": 0, "deleted": 0}
+    if table_name == "post_data":
+        report["comments_deleted"] = 0
+    if condition is None:
+        return report
+    report["expired"] = db.session.query(db.func.count(model.id)).filter(condition).scalar()
+    db.session.commit()
+    if dry_run:
+        return report
+
+    age = getattr(model, age_column)
+    while True:
+        rows = db.session.execute(
+            table.select().where(condition).order_by(age, model.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        ids = [row["id"] for row in rows]
+        if table_name == "post_data":
+            # posts go with their keyword links, which are archived with them
+            links = db.session.query(KeywordPost.post_id, KeywordPost.keyword_data_id).filter(
+                KeywordPost.post_id.in_(ids)
+            ).all()
+            keyword_data_ids = defaultdict(list)
+            for post_id, keyword_data_id in links:
+                keyword_data_ids[post_id].append(keyword_data_id)
+            rows = [dict(row, keyword_data_ids=keyword_data_ids[row["id"]]) for row in rows]
+        archive_rows(archive_dir, table_name, age_column, rows)
+        report["archived"] += len(rows)
+        if table_name == "post_data":
+            # their comments are archived with the comment_data partitions, before the
+            # posts are deleted, so the same crash guarantee holds
+            reddit_ids = [row["reddit_id"] for row in rows if row["reddit_id"] is not None]
+            comment_table = CommentData.__table__
+            comments = []
+            if reddit_ids:
+                comments = db.session.execute(
+                    comment_table.select().where(comment_table.c.post_reddit_id.in_(reddit_ids))
+                ).mappings().all()
+            if comments:
+                archive_rows(archive_dir, "comment_data", "created_date", comments)
+                comment_ids = [comment["id"] for comment in comments]
+                db.session.execute(comment_table.delete().where(comment_table.c.id.in_(comment_ids)))
+                report["comments_deleted"] += len(comments)
+            db.session.execute(KeywordPost.__table__.delete().where(KeywordPost.post_id.in_(ids)))
+            # deleting posts changes /keyword_data responses, so their ETags must change too
+            bump_keyword_versions({keyword_data_id for _, keyword_data_id in links}, datetime.utcnow())
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+        report["deleted"] += len(ids)
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return report
+
+
+def incremental_vacuum(pages_per_step):
+    # Returns free pages to the OS a step at a time; a no-op unless the database uses
+    # auto_vacuum=INCREMENTAL. Returns the number of pages freed.
+    if db.engine.dialect.name != "sqlite":
+        return 0  # server databases reclaim space with their own (auto)vacuum
+    freed = 0
+    with db.engine.connect() as connection:
+        if connection.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            current_app.logger.warning(
+                "auto_vacuum is not INCREMENTAL; run `flask maintenance --full-vacuum` once to convert the database"
+            )
+            return 0
+        free = connection.execute(text("PRAGMA freelist_count")).scalar()
+        while free:
+            # the pragma frees one page per step, so its cursor has to be drained
+            cursor = connection.connection.cursor()
+            cursor.execute("PRAGMA incremental_vacuum(%d)" % pages_per_step)
+            cursor.fetchall()
+            cursor.close()
+            connection.commit()
+            remaining = connection.execute(text("PRAGMA freelist_count")).scalar()
+            if remaining >= free:
+                break
+            freed += free - remaining
+            free = remaining
+        connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return freed
+
+
+def full_vacuum():
+    # One-off rewrite of the whole file, e.g. to switch an existing database to
+    # auto_vacuum=INCREMENTAL. Holds an exclusive lock for the duration.
+    if db.engine.dialect.name != "sqlite":
+        return
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        connection.execute(text("VACUUM"))
+
+
+def run_maintenance(dry_run=False, vacuum=True):
+    # Applies every RETENTION_POLICIES entry, then compacts the database. Another
+    # process already running maintenance makes this a no-op (returns None).
+    config = current_app.config
+    # a long lease: a run over large tables can take a while
+    with fetch_lease("maintenance", ttl=3600) as acquired:
+        if not acquired:
+            return None
+        report = {}
+        for table_name, policy in config["RETENTION_POLICIES"].items():
+            report[table_name] = apply_retention(
+                table_name,
+                policy,
+                config["RETENTION_ARCHIVE_DIR"],
+                config["RETENTION_DELETE_BATCH"],
+                config["RETENTION_BATCH_PAUSE"],
+                dry_run,
+            )
+        if any(result["deleted"] for result in report.values()):
+            # results cached for the old keyword versions are dead weight; drop them in every process
+            invalidate_caches()
+        if vacuum and not dry_run:
+            report["vacuum_pages"] = incremental_vacuum(config["RETENTION_VACUUM_PAGES"])
+    return report
@@ -0,0 +1,167 @@
+from sqlalchemy import case, select, tuple_
+from app import db
+from app.models.db_models import DailyStats, DailyStatsAuthor, KeywordData, KeywordPost, PostData
+from app.storage import dialect_insert
+
+# Materialized per-day rollups of stored posts for /stats. They are updated in the same
+# transaction that first stores a post or links it to a keyword, so reading them costs a
+# few indexed rows however many posts are stored, instead of a scan of the posts joined
+# to keyword_data. A post counts once for its subreddit, when it is first stored, and
+# once for the industry and account of each keyword that fetched it; re-fetches leave
+# the rollups alone.
+
+ROLLUP_DIMENSIONS = ("subreddit", "industry", "account_name")
+
+
+def _add_post(groups, dimension, value, row):
+    if value is None:
+        return
+    created = row["created_date"]
+    group = groups.get((dimension, value, created.date()))
+    if group is None:
+        groups[(dimension, value, created.date())] = [1, created, created, {row["author"]}]
+    else:
+        group[0] += 1
+        group[1] = min(group[1], created)
+        group[2] = max(group[2], created)
+        group[3].add(row["author"])
+
+
+def _group_posts(links, posts):
+    # (dimension, value, day) -> [post count, first post, last post, set of authors]
+    keywords = {
+        keyword_data_id: (industry, account_name)
+        for keyword_data_id, industry, account_name in db.session.query(
+            KeywordData.id, KeywordData.industry, KeywordData.account_name
+        ).filter(KeywordData.id.in_({row["keyword_data_id"] for row in links}))
+    }
+    groups = {}
+    for row in posts:
+        _add_post(groups, "subreddit", row["subreddit"], row)
+    for row in links:
+        industry, account_name = keywords[row["keyword_data_id"]]
+        _add_post(groups, "industry", industry, row)
+        _add_post(groups, "account_name", account_name, row)
+    return groups
+
+
+def record_new_posts(links, posts):
+    # Adds new keyword links (dicts with keyword_data_id, author and created_date) and
+    # newly stored posts (dicts with subreddit, author and created_date) to the rollups,
+    # in the caller's transaction
+    if not links and not posts:
+        return
+    groups = _group_posts(links, posts)
+    stats = DailyStats.__table__
+    stmt = dialect_insert(stats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["dimension", "value", "day"],
+        set_={
+            "post_count": stats.c.post_count + stmt.excluded.post_count,
+            "first_post": case(
+                (stmt.excluded.first_post < stats.c.first_post, stmt.excluded.first_post), else_=stats.c.first_post
+            ),
+            "last_post": case(
+                (stmt.excluded.last_post > stats.c.last_post, stmt.excluded.last_post), else_=stats.c.last_post
+            ),
+        },
+    )
+    db.session.execute(stmt, [
+        {
+            "dimension": dimension,
+            "value": value,
+            "day": day,
+            "post_count": post_count,
+            "author_count": 0,
+            "first_post": first_post,
+            "last_post": last_post,
+        }
+        for (dimension, value, day), (post_count, first_post, last_post, _) in groups.items()
+    ])
+
+    # distinct authors aren't additive, so each group's count is taken from its author set
+    db.session.execute(
+        dialect_insert(DailyStatsAuthor.__table__).on_conflict_do_nothing(
+            index_elements=["dimension", "value", "day", "author"]
+        ),
+        [
+            {"dimension": dimension, "value": value, "day": day, "author": author}
+            for (dimension, value, day), group in groups.items()
+            for author in group[3]
+        ],
+    )
+    authors = DailyStatsAuthor.__table__
+    author_count = (
+        select(db.func.count())
+        .where(authors.c.dimension == stats.c.dimension, authors.c.value == stats.c.value, authors.c.day == stats.c.day)
+        .scalar_subquery()
+    )
+    keys = list(groups)
+    for offset in range(0, len(keys), 300):
+        db.session.execute(
+            stats.update()
+            .where(tuple_(stats.c.dimension, stats.c.value, stats.c.day).in_(keys[offset:offset + 300]))
+            .values(author_count=author_count)
+        )
+
+
+def rebuild_rollups(chunk_size=5000):
+    # Recomputes the rollups from the stored posts in one transaction, e.g. to backfill
+    # a database that had posts before the rollup tables existed. Days whose posts
+    # retention already deleted are lost. Returns the number of posts counted.
+    db.session.execute(DailyStatsAuthor.__table__.delete())
+    db.session.execute(DailyStats.__table__.delete())
+    last_id = 0
+    counted = 0
+    while True:
+        # the subreddit dimension, once per post
+        posts = db.session.execute(
+            select(PostData.id, PostData.subreddit, PostData.author, PostData.created_date)
+            .where(PostData.id > last_id)
+            .order_by(PostData.id)
+            .limit(chunk_size)
+        ).mappings().all()
+        if not posts:
+            break
+        record_new_posts([], posts)
+        last_id = posts[-1]["id"]
+        counted += len(posts)
+    last_id = 0
+    while True:
+        # industry and account, once per keyword linking each post
+        links = db.session.execute(
+            select(KeywordPost.id, KeywordPost.keyword_data_id, PostData.author, PostData.created_date)
+            .join(PostData, PostData.id == KeywordPost.post_id)
+            .where(KeywordPost.id > last_id)
+            .order_by(KeywordPost.id)
+            .limit(chunk_size)
+        ).mappings().all()
+        if not links:
+            break
+        record_new_posts(links, [])
+        last_id = links[-1]["id"]
+    db.session.commit()
+    return counted
+
+
+def get_daily_stats(dimension, value=None, since=None, until=None, limit=1000):
+    # Rollup rows for one dimension, newest day first. `since` is inclusive and `until`
+    # exclusive, both dates.
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError("Unknown group %r, expected one of %s" % (dimension, ", ".join(ROLLUP_DIMENSIONS)))
+    query = db.session.query(
+        DailyStats.dimension,
+        DailyStats.value,
+        DailyStats.day,
+        DailyStats.post_count,
+        DailyStats.author_count,
+        DailyStats.first_post,
+        DailyStats.last_post,
+    ).filter(DailyStats.dimension == dimension)
+    if value is not None:
+        query = query.filter(DailyStats.value == value)
+    if since is not None:
+        query = query.filter(DailyStats.day >= since)
+    if until is not None:
+        query = query.filter(DailyStats.day < until)
+    return query.order_by(DailyStats.day.desc(), DailyStats.value).limit(limit).all()
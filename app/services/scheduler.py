@@ -0,0 +1,125 @@
+import heapq
+import math
+import time
+from datetime import datetime
+from app import db
+from app.models.db_models import IngestionJob, KeywordData
+from app.services import shared_state
+from app.services.comment_services import ingest_comments
+from app.services.keyword_services import fetch_and_store_reddit_data
+from app.services.rate_limit import RequestBudget, RequestBudgetExceeded, spending
+from app.services.reddit_clients import reddit_clients
+from app.services.retention import run_maintenance
+from app.services.singleflight import fetch_lease
+
+# Background ingestion: refreshes keywords from Reddit outside the request path, most
+# stale and most requested first, within a per-cycle Reddit request budget. The budget
+# counts the tokens every Reddit request takes from the client rate limiters, so it is
+# what the cycle actually spent, comment expansion included.
+
+# staleness, in TTL units, given to keywords that have never been fetched
+NEVER_FETCHED_STALENESS = 1e6
+
+
+def keyword_priority(keyword_data, ttl, now):
+    # Staleness in TTL units, weighted by how often the keyword is read. Keywords that
+    # have never been fetched go first; fresh ones (< 1 TTL old) are not due.
+    if keyword_data.last_fetched is None:
+        staleness = NEVER_FETCHED_STALENESS
+    else:
+        staleness = (now - keyword_data.last_fetched).total_seconds() / ttl
+    if staleness < 1:
+        return 0
+    return staleness * (1 + math.log1p(keyword_data.request_count or 0))
+
+
+def build_refresh_queue(ttl, now=None):
+    now = now or datetime.utcnow()
+    queue = []
+    for keyword_data in KeywordData.query.all():
+        priority = keyword_priority(keyword_data, ttl, now)
+        if priority > 0:
+            heapq.heappush(queue, (-priority, keyword_data.id, keyword_data.keyword))
+    return queue
+
+
+def run_ingestion_cycle(app):
+    # Refreshes due keywords in priority order, then expands comments, until the cycle's
+    # Reddit request budget (which grows with the number of pooled credential sets) is
+    # spent, skipping keywords another process is already fetching. A fetch that runs
+    # out of budget stops at its next request. Returns the number of keywords attempted.
+    config = app.config
+    attempted = 0
+    with app.app_context():
+        # credentials posted to any API worker since the last cycle
+        shared_state.sync()
+        budget = RequestBudget(config["INGEST_REQUEST_BUDGET"] * max(1, len(reddit_clients)))
+        with spending(budget):
+            queue = build_refresh_queue(config["KEYWORD_CACHE_TTL"])
+            while queue and budget.remaining > 0:
+                priority, keyword_data_id, keyword = heapq.heappop(queue)
+                with fetch_lease("keyword:" + keyword) as acquired:
+                    if acquired:
+                        _run_job(app, keyword, keyword_data_id, -priority, budget)
+                        attempted += 1
+            if config["COMMENT_INGESTION"] and budget.remaining > 0:
+                posts, comments = ingest_comments()
+                app.logger.info("Ingested %d comments from %d posts", comments, posts)
+        app.logger.info("Ingestion cycle used %d Reddit requests", budget.used)
+        db.session.remove()
+    return attempted
+
+
+def _run_job(app, keyword, keyword_data_id, priority, budget):
+    # Refreshes one keyword and records it as an IngestionJob, with the requests it made.
+    # A fetch cut short by the budget keeps the chunks it stored and leaves the keyword's
+    # cursor where it was, so the next cycle picks up from the same point.
+    job = IngestionJob(keyword_data_id=keyword_data_id, status="running", priority=priority)
+    db.session.add(job)
+    db.session.commit()
+
+    started = time.perf_counter()
+    used_before = budget.used
+    try:
+        posts = fetch_and_store_reddit_data(keyword, keyword_data_id)
+    except RequestBudgetExceeded as exc:
+        db.session.rollback()
+        job.status = "partial"
+        job.error = str(exc)
+    except Exception as exc:
+        db.session.rollback()
+        app.logger.exception("Ingestion failed for keyword %r", keyword)
+        job.status = "failed"
+        job.error = str(exc)
+    else:
+        job.status = "succeeded"
+        job.posts_fetched = posts
+    job.requests_used = budget.used - used_before
+    job.finished_at = datetime.utcnow()
+    job.duration_ms = (time.perf_counter() - started) * 1000
+    db.session.commit()
+
+
+def run_scheduled_maintenance(app):
+    with app.app_context():
+        report = run_maintenance()
+        db.session.remove()
+    if report is not None:
+        app.logger.info("Maintenance finished: %s", report)
+
+
+def run_worker(app, once=False):
+    # Ingestion every INGEST_INTERVAL seconds; retention and compaction on start and
+    # then every RETENTION_INTERVAL seconds
+    interval = app.config["INGEST_INTERVAL"]
+    maintenance_due = time.monotonic()
+    while True:
+        started = time.monotonic()
+        attempted = run_ingestion_cycle(app)
+        app.logger.info("Ingestion cycle refreshed %d keywords", attempted)
+        if once:
+            return
+        if started >= maintenance_due:
+            run_scheduled_maintenance(app)
+            maintenance_due = time.monotonic() + app.config["RETENTION_INTERVAL"]
+        time.sleep(max(0, interval - (time.monotonic() - started)))
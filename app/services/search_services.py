@@ -0,0 +1,102 @@
+from sqlalchemy import DateTime, bindparam, text
+from app import db
+
+# Full-text search over stored post titles and bodies, each post indexed once however
+# many keywords fetched it. SQLite uses an external-content
+# FTS5 table kept in sync by triggers (so inserts, upserts and deletes made anywhere
+# update it); Postgres uses a generated tsvector column with a GIN index.
+
+SQLITE_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS post_data_fts USING fts5(
+        title, comment, content='post_data', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS post_data_fts_ai AFTER INSERT ON post_data BEGIN
+        INSERT INTO post_data_fts(rowid, title, comment) VALUES (new.id, new.title, new.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_data_fts_ad AFTER DELETE ON post_data BEGIN
+        INSERT INTO post_data_fts(post_data_fts, rowid, title, comment)
+        VALUES ('delete', old.id, old.title, old.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_data_fts_au AFTER UPDATE OF title, comment ON post_data BEGIN
+        INSERT INTO post_data_fts(post_data_fts, rowid, title, comment)
+        VALUES ('delete', old.id, old.title, old.comment);
+        INSERT INTO post_data_fts(rowid, title, comment) VALUES (new.id, new.title, new.comment);
+    END""",
+)
+
+POSTGRES_SEARCH_DDL = (
+    """ALTER TABLE post_data ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(comment, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_post_data_search_vector ON post_data USING GIN (search_vector)",
+)
+
+
+def ensure_search_index(connection):
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            connection.execute(text(statement))
+    elif dialect == "sqlite":
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_data_fts'"
+        )).first()
+        for statement in SQLITE_SEARCH_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            # index the rows stored before the search table existed
+            connection.execute(text("INSERT INTO post_data_fts(post_data_fts) VALUES ('rebuild')"))
+
+
+def _fts5_query(query):
+    # Quote every term so user input is matched as plain words (implicit AND), never
+    # parsed as FTS5 syntax
+    return " ".join('"%s"' % term.replace('"', '""') for term in query.split())
+
+
+def search_posts(query, keyword=None, subreddit=None, since=None, until=None, page=1, per_page=20):
+    # Ranked (best match first), paginated search results as dicts
+    params = {"limit": per_page, "offset": (page - 1) * per_page}
+    filters = []
+    if keyword:
+        filters.append("k.keyword = :keyword")
+        params["keyword"] = keyword
+    if subreddit:
+        filters.append("p.subreddit = :subreddit")
+        params["subreddit"] = subreddit
+    if since is not None:
+        filters.append("p.created_date >= :since")
+        params["since"] = since
+    if until is not None:
+        filters.append("p.created_date < :until")
+        params["until"] = until
+
+    # one result per keyword a matching post was fetched for
+    columns = (
+        "p.id, p.reddit_id, p.subreddit, p.title, p.comment, p.author, p.created_date, "
+        "kp.keyword_data_id, k.keyword"
+    )
+    joins = "JOIN keyword_post kp ON kp.post_id = p.id JOIN keyword_data k ON k.id = kp.keyword_data_id"
+    if db.engine.dialect.name == "postgresql":
+        params["query"] = query
+        sql = (
+            "SELECT %s, ts_rank(p.search_vector, q) AS rank "
+            "FROM post_data p " + joins + ", websearch_to_tsquery('english', :query) q "
+            "WHERE p.search_vector @@ q %s ORDER BY rank DESC, p.id, k.id LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params["query"] = _fts5_query(query)
+        # bm25() is lower for better matches; negate so rank is higher-is-better on both backends
+        sql = (
+            "SELECT %s, -bm25(post_data_fts, 2.0, 1.0) AS rank "
+            "FROM post_data_fts JOIN post_data p ON p.id = post_data_fts.rowid " + joins + " "
+            "WHERE post_data_fts MATCH :query %s ORDER BY rank DESC, p.id, k.id LIMIT :limit OFFSET :offset"
+        )
+    where = "".join(" AND " + condition for condition in filters)
+    statement = text(sql % (columns, where)).bindparams(*[
+        bindparam(name, type_=DateTime) for name in ("since", "until") if name in params
+    ]).columns(created_date=DateTime)
+    rows = db.session.execute(statement, params)
+    return [dict(row._mapping) for row in rows]
@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select, update
+from app import db
+from app.models.db_models import FetchLease, SharedState
+from app.services.cache import clear_caches
+from app.storage import dialect_insert
+
+# State every API worker and ingestion process has to agree on: named JSON values (the
+# pooled Reddit credentials, the cache generation) and the fetch leases. It lives in the
+# app database by default, or on a Redis-compatible server when SHARED_STATE_URL is a
+# redis:// URL. Each value carries a version bumped on every write; processes compare
+# versions at most every SHARED_STATE_POLL_INTERVAL seconds (one small query) and run
+# the callbacks registered with watch() for the values that changed.
+
+CREDENTIALS_KEY = "reddit_credentials"
+CACHE_GENERATION_KEY = "cache_generation"
+
+
+class DatabaseStateBackend:
+    # Runs on its own connection, one short transaction per call, so it never commits
+    # or rolls back whatever the caller's db.session has pending
+    def get(self, key):
+        # (value, version), or (None, 0) if the key was never set
+        table = SharedState.__table__
+        with db.engine.begin() as connection:
+            row = connection.execute(select(table.c.value, table.c.version).where(table.c.key == key)).first()
+        return (json.loads(row.value), row.version) if row is not None else (None, 0)
+
+    def set(self, key, value):
+        # Returns the new version
+        table = SharedState.__table__
+        stmt = dialect_insert(table).values(key=key, value=json.dumps(value), version=1, updated_at=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"value": stmt.excluded.value, "version": table.c.version + 1, "updated_at": stmt.excluded.updated_at},
+        )
+        with db.engine.begin() as connection:
+            connection.execute(stmt)
+            return connection.execute(select(table.c.version).where(table.c.key == key)).scalar()
+
+    def versions(self, keys):
+        table = SharedState.__table__
+        with db.engine.begin() as connection:
+            versions = dict(connection.execute(select(table.c.key, table.c.version).where(table.c.key.in_(keys))).all())
+        return {key: versions.get(key, 0) for key in keys}
+
+    def acquire_lease(self, key, owner, ttl):
+        # Takes the lease unless another owner holds an unexpired one
+        table = FetchLease.__table__
+        now = datetime.utcnow()
+        stmt = dialect_insert(table).values(key=key, owner=owner, expires_at=now + timedelta(seconds=ttl))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+            where=table.c.expires_at < now,
+        )
+        with db.engine.begin() as connection:
+            connection.execute(stmt)
+            holder = connection.execute(select(table.c.owner).where(table.c.key == key)).scalar()
+        return holder == owner
+
+    def renew_lease(self, key, owner, ttl):
+        # Extends the lease if `owner` still holds it; returns whether it did
+        table = FetchLease.__table__
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(table)
+                .where(table.c.key == key, table.c.owner == owner)
+                .values(expires_at=datetime.utcnow() + timedelta(seconds=ttl))
+            )
+        return result.rowcount == 1
+
+    def release_lease(self, key, owner):
+        table = FetchLease.__table__
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.key == key, table.c.owner == owner))
+
+    def lease_held(self, key):
+        table = FetchLease.__table__
+        with db.engine.begin() as connection:
+            held = connection.execute(
+                select(table.c.key).where(table.c.key == key, table.c.expires_at >= datetime.utcnow())
+            ).first()
+        return held is not None
+
+
+# deletes the lease only if `owner` still holds it
+_RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# resets the lease's TTL (ARGV[2] ms) only if `owner` still holds it
+_RENEW_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class RedisStateBackend:
+    # Values are hashes of {value, version}; leases are keys set with NX and a TTL, so
+    # Redis expires them itself
+    def __init__(self, url, prefix):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SHARED_STATE_URL %r needs the redis package to be installed" % url)
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._release_lease = self._redis.register_script(_RELEASE_LEASE_SCRIPT)
+        self._renew_lease = self._redis.register_script(_RENEW_LEASE_SCRIPT)
+
+    def _state_key(self, key):
+        return self._prefix + "state:" + key
+
+    def _lease_key(self, key):
+        return self._prefix + "lease:" + key
+
+    def get(self, key):
+        value, version = self._redis.hmget(self._state_key(key), "value", "version")
+        return (json.loads(value), int(version)) if value is not None else (None, 0)
+
+    def set(self, key, value):
+        pipeline = self._redis.pipeline()  # MULTI/EXEC, so value and version change together
+        pipeline.hset(self._state_key(key), "value", json.dumps(value))
+        pipeline.hincrby(self._state_key(key), "version", 1)
+        return pipeline.execute()[1]
+
+    def versions(self, keys):
+        pipeline = self._redis.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hget(self._state_key(key), "version")
+        return {key: int(version or 0) for key, version in zip(keys, pipeline.execute())}
+
+    def acquire_lease(self, key, owner, ttl):
+        return bool(self._redis.set(self._lease_key(key), owner, nx=True, px=int(ttl * 1000)))
+
+    def renew_lease(self, key, owner, ttl):
+        return bool(self._renew_lease(keys=[self._lease_key(key)], args=[owner, int(ttl * 1000)]))
+
+    def release_lease(self, key, owner):
+        self._release_lease(keys=[self._lease_key(key)], args=[owner])
+
+    def lease_held(self, key):
+        return bool(self._redis.exists(self._lease_key(key)))
+
+
+_backend = None
+_watchers = {}  # key -> callback(value)
+_seen_versions = {}
+_sync_lock = threading.Lock()
+_synced_at = None
+
+
+def configure(app):
+    # Picks the backend for SHARED_STATE_URL and polls for changes before each request
+    global _backend, _synced_at
+    url = app.config["SHARED_STATE_URL"]
+    _backend = RedisStateBackend(url, app.config["SHARED_STATE_PREFIX"]) if url else DatabaseStateBackend()
+    _seen_versions.clear()
+    _synced_at = None
+    app.before_request(sync)
+
+
+def backend():
+    return _backend
+
+
+def watch(key, callback):
+    # Runs callback(value) in this process whenever another process publishes `key`,
+    # and on the first sync if it was published before this process started
+    _watchers[key] = callback
+
+
+def publish(key, value):
+    # Stores `value` for every process. The caller applies it locally itself.
+    _seen_versions[key] = _backend.set(key, value)
+
+
+def sync(force=False):
+    # Applies values other processes published since the last sync. Runs at most every
+    # SHARED_STATE_POLL_INTERVAL seconds, and in one thread at a time; other threads
+    # carry on with the current state rather than wait.
+    global _synced_at
+    if not _watchers:
+        return
+    now = time.monotonic()
+    if not force and _synced_at is not None and now - _synced_at < current_app.config["SHARED_STATE_POLL_INTERVAL"]:
+        return
+    if not _sync_lock.acquire(blocking=False):
+        return
+    try:
+        _synced_at = now
+        for key, version in _backend.versions(list(_watchers)).items():
+            if version and version != _seen_versions.get(key):
+                value, version = _backend.get(key)
+                _watchers[key](value)
+                _seen_versions[key] = version
+    except Exception:
+        # keep serving with the current state; the next poll retries
+        current_app.logger.exception("Could not sync shared state")
+    finally:
+        _sync_lock.release()
+
+
+def invalidate_caches():
+    # Makes every process drop its in-process result caches, e.g. after bulk deletes
+    clear_caches()
+    publish(CACHE_GENERATION_KEY, datetime.utcnow().isoformat())
@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from flask import current_app
+from app.services import shared_state
+
+# Request coalescing for Reddit fetches. Within a process, concurrent callers for the
+# same key share one call (SingleFlight, or AsyncSingleFlight on an event loop); across
+# processes, a lease in the shared state backend (a fetch_lease row, or a Redis key)
+# marks which process owns the fetch for a key. A fetch renews the leases it holds as
+# it stores posts (renew_leases), so one that runs longer than the lease TTL keeps it.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        # The first caller for `key` runs fn; callers arriving while it runs wait and
+        # get the same result (or exception)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    # SingleFlight for coroutines. The call runs as its own task, so one caller going
+    # away doesn't cancel it for the others; it is cancelled once every caller has.
+    def __init__(self):
+        self._calls = {}  # key -> [task, callers waiting]
+
+    async def do(self, key, fn):
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = [asyncio.ensure_future(fn()), 0]
+            call[0].add_done_callback(lambda task: self._forget(key, task))
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0])
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not call[0].done():
+                call[0].cancel()
+
+    def _forget(self, key, task):
+        if key in self._calls and self._calls[key][0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # marks it retrieved even if every caller went away
+
+
+keyword_flights = SingleFlight()
+async_keyword_flights = AsyncSingleFlight()
+
+
+def _new_owner():
+    return "%s:%d:%s" % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:12])
+
+
+def acquire_lease(key, ttl=None):
+    # Takes the lease unless another owner holds an unexpired one. Returns the owner
+    # token to pass to release_lease, or None.
+    owner = _new_owner()
+    if shared_state.backend().acquire_lease(key, owner, ttl or current_app.config["FETCH_LEASE_TTL"]):
+        return owner
+    return None
+
+
+def release_lease(key, owner):
+    shared_state.backend().release_lease(key, owner)
+
+
+class _HeldLease:
+    def __init__(self, key, owner, ttl):
+        self.key = key
+        self.owner = owner
+        self.ttl = ttl
+        self.renewed_at = time.monotonic()
+
+
+# leases taken by fetch_lease in the current thread or task; run_sync copies them to
+# the write pool along with the rest of the context
+_held_leases = contextvars.ContextVar("held_leases", default=())
+
+
+@contextmanager
+def holding_lease(key, owner, ttl=None):
+    # Registers a lease taken with acquire_lease for renew_leases while the block runs
+    lease = _HeldLease(key, owner, ttl or current_app.config["FETCH_LEASE_TTL"])
+    token = _held_leases.set(_held_leases.get() + (lease,))
+    try:
+        yield lease
+    finally:
+        _held_leases.reset(token)
+
+
+def renew_leases():
+    # Pushes back the expiry of the leases this fetch holds, once a third of their TTL
+    # has passed since the last renewal. Called as a fetch makes progress.
+    for lease in _held_leases.get():
+        if time.monotonic() - lease.renewed_at < lease.ttl / 3:
+            continue
+        if not shared_state.backend().renew_lease(lease.key, lease.owner, lease.ttl):
+            current_app.logger.warning("Fetch lease on %s expired before it was renewed", lease.key)
+        lease.renewed_at = time.monotonic()
+
+
+def wait_for_lease(key, timeout=None):
+    # Polls until nobody holds an unexpired lease on `key`; returns False on timeout
+    config = current_app.config
+    deadline = time.monotonic() + (timeout or config["FETCH_LEASE_TTL"])
+    while time.monotonic() < deadline:
+        if not shared_state.backend().lease_held(key):
+            return True
+        time.sleep(config["FETCH_LEASE_POLL_INTERVAL"])
+    return False
+
+
+@contextmanager
+def fetch_lease(key, ttl=None):
+    # Yields True if this process now owns the fetch for `key`, False if another does
+    owner = acquire_lease(key, ttl)
+    if owner is None:
+        yield False
+        return
+    try:
+        with holding_lease(key, owner, ttl):
+            yield True
+    finally:
+        release_lease(key, owner)
@@ -0,0 +1,219 @@
+import hashlib
+import sqlite3
+from datetime import datetime
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app import db
+
+# Storage engine layer: per-connection SQLite tuning, in-place schema upgrades for
+# existing database files (skipped at startup when the schema is already current), and
+# copying a database to another backend (e.g. Postgres).
+
+_sqlite_pragmas = {}
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # Applies to every SQLite connection, including the PRAW log writer's own engine
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    _apply_sqlite_pragmas(dbapi_connection)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    for name, value in _sqlite_pragmas.items():
+        cursor.execute("PRAGMA %s = %s" % (name, value))
+    cursor.close()
+
+
+def dialect_insert(table):
+    # INSERT construct with on_conflict_do_update/do_nothing for the current backend
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+# async drivers for the async serving mode, by backend
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def create_async_db_engine(url=None, engine_options=None):
+    # SQLAlchemy asyncio engine for the async serving mode: on `url`, or on the app
+    # database with its driver swapped for the backend's ASYNC_DRIVERS entry. Needs
+    # aiosqlite or asyncpg installed.
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if url is None:
+        url = db.engine.url
+        if url.get_backend_name() not in ASYNC_DRIVERS:
+            raise RuntimeError("No async driver known for %s; set ASYNC_DATABASE_URL" % url.get_backend_name())
+        url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    engine = create_async_engine(make_url(url), **(engine_options or {}))
+    if engine.dialect.name == "sqlite":
+        # aiosqlite connections aren't sqlite3.Connection objects, so they get the pragmas here
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def engine_options(config):
+    # Pool tuning for server databases, worked out from the final database URI (a
+    # config class or test may override it after DATABASE_URL was read); options set in
+    # SQLALCHEMY_ENGINE_OPTIONS win
+    options = {}
+    if make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() != "sqlite":
+        options = {
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_recycle": config["DB_POOL_RECYCLE"],
+            "pool_pre_ping": True,
+        }
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    return options
+
+
+def configure_storage(app):
+    _sqlite_pragmas.clear()
+    _sqlite_pragmas.update(app.config["SQLITE_PRAGMAS"])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+
+
+def schema_fingerprint():
+    # Hash of every table, column, index and the search DDL; changes whenever a model does
+    from app.services.search_services import POSTGRES_SEARCH_DDL, SQLITE_SEARCH_DDL
+
+    parts = list(SQLITE_SEARCH_DDL + POSTGRES_SEARCH_DDL)
+    for table in db.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend("%s %s %s" % (column.name, column.type, column.nullable) for column in table.columns)
+        parts.extend(sorted("%s %s" % (index.name, index.unique) for index in table.indexes))
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def ensure_schema():
+    # Startup check: one query against schema_version, and the full upgrade only when
+    # the models changed since the database was last upgraded (or it is new). Returns
+    # True if it upgraded.
+    from app.models.db_models import SchemaVersion
+
+    try:
+        current = db.session.query(SchemaVersion.fingerprint).filter_by(id=1).scalar()
+    except (OperationalError, ProgrammingError):
+        current = None  # no schema_version table yet
+    db.session.rollback()
+    if current == schema_fingerprint():
+        return False
+    upgrade_schema()
+    return True
+
+
+def upgrade_schema():
+    # create_all only creates missing tables; older database files also need the
+    # columns and indexes added to existing tables since they were created, and their
+    # data moved into any tables that replaced old ones
+    from app.models.db_models import DailyStats, SchemaVersion
+
+    existing_tables = set(inspect(db.engine).get_table_names())
+    db.create_all()
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(
+                    'ALTER TABLE %s ADD COLUMN "%s" %s' % (table.name, column.name, column_type)
+                ))
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+
+        if "subreddit_data" in existing_tables:
+            migrate_subreddit_data(connection, {column["name"] for column in inspector.get_columns("subreddit_data")})
+
+        from app.services.search_services import ensure_search_index
+        ensure_search_index(connection)
+
+    if DailyStats.__tablename__ not in existing_tables:
+        # backfill the /stats rollups from posts stored before they existed
+        from app.services.rollup_services import rebuild_rollups
+        rebuild_rollups()
+
+    with db.engine.begin() as connection:
+        stmt = dialect_insert(SchemaVersion.__table__).values(
+            id=1, fingerprint=schema_fingerprint(), upgraded_at=datetime.utcnow()
+        )
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"fingerprint": stmt.excluded.fingerprint, "upgraded_at": stmt.excluded.upgraded_at},
+        ))
+
+
+def migrate_subreddit_data(connection, columns):
+    # subreddit_data kept a full copy of a post for every keyword that fetched it.
+    # Collapses it into one post_data row per Reddit id (the most recently stored copy)
+    # plus keyword_post links, then drops it. Each post keeps the id of the row it came
+    # from, so ids stay unique. content_hash is left empty and filled in the next time
+    # the post is fetched. Tables from before Reddit ids were recorded have no reddit_id
+    # column; every row of those becomes a post without one.
+    if "reddit_id" in columns:
+        reddit_id = "s.reddit_id"
+        kept = "s.reddit_id IS NULL OR s.id IN (SELECT MAX(id) FROM subreddit_data WHERE reddit_id IS NOT NULL GROUP BY reddit_id)"
+        same_post = "p.reddit_id = s.reddit_id"
+    else:
+        reddit_id, kept, same_post = "NULL", "true", "false"
+    comments_fetched = "s.comments_fetched" if "comments_fetched" in columns else "NULL"
+    connection.execute(text(
+        "INSERT INTO post_data (id, reddit_id, subreddit, comment, created_date, author, title, comments_fetched) "
+        "SELECT s.id, %s, s.subreddit, s.comment, s.created_date, s.author, s.title, %s "
+        "FROM subreddit_data s WHERE %s" % (reddit_id, comments_fetched, kept)
+    ))
+    connection.execute(text(
+        "INSERT INTO keyword_post (keyword_data_id, post_id, created_date) "
+        "SELECT s.keyword_data_id, COALESCE(p.id, s.id), s.created_date "
+        "FROM subreddit_data s LEFT JOIN post_data p ON %s "
+        "WHERE true ON CONFLICT DO NOTHING" % same_post
+    ))
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS subreddit_data_fts"))
+    connection.execute(text("DROP TABLE subreddit_data"))
+    if connection.dialect.name == "postgresql":
+        # explicit ids were inserted, so move the sequence past them
+        connection.execute(text(
+            "SELECT setval(pg_get_serial_sequence('post_data', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM post_data), 0) + 1, false)"
+        ))
+
+
+def copy_database(target_url, chunk_size=5000):
+    # Copies every table of the app's database into `target_url`, e.g. to move an
+    # existing subredditv6.db onto Postgres. Tables are created on the target first.
+    target = create_engine(target_url)
+    db.metadata.create_all(target)
+    copied = {}
+    with db.engine.connect() as source, target.begin() as destination:
+        for table in db.metadata.sorted_tables:
+            count = 0
+            result = source.execution_options(stream_results=True).execute(table.select())
+            for rows in result.mappings().partitions(chunk_size):
+                destination.execute(table.insert(), [dict(row) for row in rows])
+                count += len(rows)
+            copied[table.name] = count
+
+        if target.dialect.name == "postgresql":
+            # explicit ids were inserted, so move the id sequences past them
+            for table in db.metadata.sorted_tables:
+                if "id" in table.c:
+                    destination.execute(text(
+                        "SELECT setval(pg_get_serial_sequence('%s', 'id'), "
+                        "COALESCE((SELECT MAX(id) FROM %s), 0) + 1, false)" % (table.name, table.name)
+                    ))
+    target.dispose()
+    return copied
@@ -1,34 +1,119 @@
-import praw
 import logging
+import queue
+import threading
+import time
+from datetime import datetime
 from flask import current_app
+from sqlalchemy import create_engine
 from app.models.db_models import PRAWLogData
 from app import db
 
-# Global variable for Reddit client
-reddit = None
-
-
-def get_reddit():
-    global reddit
-    if reddit is None:
-        reddit = praw.Reddit(
-            client_id=current_app.config["REDDIT_ID"],
-            client_secret=current_app.config["REDDIT_SECRET"],
-            user_agent=current_app.config["REDDIT_USER_AGENT"],
-        )
-    return reddit
+_STOP = object()
 
 
 class PRAWLogHandler(logging.Handler):
+    # Non-blocking handler: emit() only enqueues the record, a background thread
+    # bulk-inserts the rows through its own engine once `batch_size` rows are queued
+    # or `flush_interval` seconds have passed. Records arriving while the queue is
+    # full are counted in `dropped` instead of blocking the caller.
+    def __init__(self, engine, table, capacity=10000, batch_size=500, flush_interval=2.0):
+        super().__init__()
+        self.engine = engine
+        self.table = table
+        # longer messages (e.g. prawcore's request dumps) are cut to fit, since one
+        # oversized row fails the whole batch on databases that enforce the length
+        self.log_length = table.c.log.type.length
+        self.queue = queue.Queue(maxsize=capacity)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._run, name="praw-log-writer", daemon=True)
+        self._writer.start()
+
     def emit(self, record):
-        log_entry = self.format(record)
-        db.session.add(PRAWLogData(log=log_entry))
-        db.session.commit()
+        try:
+            row = {
+                "log": self.format(record)[:self.log_length],
+                "level": record.levelname,
+                "timestamp": datetime.utcfromtimestamp(record.created),
+            }
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self._count_dropped(1)
+
+    def _count_dropped(self, count):
+        with self._dropped_lock:
+            self.dropped += count
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            self._write(batch)
+
+    def _write(self, batch):
+        with self._dropped_lock:
+            newly_dropped = self.dropped - self._reported_dropped
+            self._reported_dropped = self.dropped
+        if newly_dropped:
+            batch.append({
+                "log": "PRAWLogHandler queue full, dropped %d log records" % newly_dropped,
+                "level": "WARNING",
+                "timestamp": datetime.utcnow(),
+            })
+        if not batch:
+            return
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(self.table.insert(), batch)
+        except Exception:
+            # the summary row is not a record; the drops it reported go into the next one
+            with self._dropped_lock:
+                self.dropped += len(batch) - (1 if newly_dropped else 0)
+                self._reported_dropped -= newly_dropped
+
+    def close(self):
+        # Drain whatever is queued, stop the writer and close the handler's engine; safe
+        # to call more than once
+        if self._writer.is_alive():
+            self.queue.put(_STOP)
+            self._writer.join()
+        self.engine.dispose()
+        super().close()
 
 
 def configure_praw_logging():
-    praw_log_handler = PRAWLogHandler()
+    # Must run inside an app context; the handler gets its own engine so log writes
+    # never share a connection or transaction with request sessions
+    config = current_app.config
+    praw_log_handler = PRAWLogHandler(
+        create_engine(db.engine.url),
+        PRAWLogData.__table__,
+        capacity=config["PRAW_LOG_QUEUE_SIZE"],
+        batch_size=config["PRAW_LOG_BATCH_SIZE"],
+        flush_interval=config["PRAW_LOG_FLUSH_INTERVAL"],
+    )
     for logger_name in ("praw", "prawcore"):
         logger = logging.getLogger(logger_name)
         logger.setLevel(logging.DEBUG)
+        for handler in [h for h in logger.handlers if isinstance(h, PRAWLogHandler)]:
+            logger.removeHandler(handler)
+            handler.close()
         logger.addHandler(praw_log_handler)
+    return praw_log_handler
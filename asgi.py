@@ -0,0 +1,6 @@
+from app.asgi import create_asgi_app
+
+# Async serving mode: /keyword_data on an event loop, everything else through the Flask
+# app (uvicorn asgi:app --workers 2). run.py stays the WSGI entry point.
+
+app = create_asgi_app()
@@ -0,0 +1,47 @@
+import argparse
+import json
+
+# Compares two benchmark result files metric by metric:
+#   python -m benchmarks.compare before.json after.json
+
+
+def flatten(results, prefix=""):
+    metrics = {}
+    for key, value in results.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before = flatten(json.load(before_file)["results"])
+        after = flatten(json.load(after_file)["results"])
+
+    width = max((len(name) for name in before.keys() | after.keys()), default=0)
+    for name in sorted(before.keys() | after.keys()):
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            change = "only in %s" % ("after" if old is None else "before")
+        elif old == 0:
+            change = ""
+        else:
+            change = "%+.1f%%" % ((new - old) / old * 100)
+        print("%-*s  %14s  %14s  %s" % (
+            width, name,
+            "-" if old is None else "%.3f" % old,
+            "-" if new is None else "%.3f" % new,
+            change,
+        ))
+
+
+if __name__ == "__main__":
+    main()
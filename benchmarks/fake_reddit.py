@@ -0,0 +1,233 @@
+import asyncio
+import random
+import threading
+import time
+
+# Offline stand-in for praw.Reddit: serves synthetic submissions from memory with a
+# configurable per-request latency, so benchmarks never touch the network.
+# FakeAsyncReddit is the asyncpraw-shaped view of the same data.
+
+PAGE_SIZE = 100  # Reddit listing page size; each page costs one simulated request
+MORE_BATCH = 20  # top-level comments per "load more comments" expansion
+
+
+class FakeRedditor:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeSubredditRef:
+    def __init__(self, display_name):
+        self.display_name = display_name
+
+
+class FakeSubmission:
+    def __init__(self, subreddit, number, created_utc, rng):
+        self.id = "%x" % number
+        self.fullname = "t3_" + self.id
+        self.name = self.fullname
+        self.subreddit = FakeSubredditRef(subreddit)
+        self.title = "Synthetic post %d in r/%s" % (number, subreddit)
+        self.selftext = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+        self.created_utc = created_utc
+        self.author = FakeRedditor("user%d" % rng.randint(1, 500)) if rng.random() > 0.05 else None
+        self.score = rng.randint(0, 5000)
+        self.num_comments = rng.randint(0, 300)
+
+
+WORDS = (
+    "reddit python flask sqlite latency cache index query worker post comment pizza "
+    "coffee market launch review update question answer thread benchmark"
+).split()
+
+
+class FakeComment:
+    def __init__(self, fullname, parent_id, created_utc, rng):
+        self.fullname = fullname
+        self.id = fullname[3:]
+        self.parent_id = parent_id
+        self.body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40)))
+        self.author = FakeRedditor("user%d" % rng.randint(1, 500)) if rng.random() > 0.05 else None
+        self.score = rng.randint(-10, 2000)
+        self.created_utc = created_utc
+        self.replies = []
+
+
+class FakeCommentForest(list):
+    # Top-level comments, with further batches behind "load more comments" placeholders;
+    # like praw, replace_more() expands up to `limit` of them (one request each), removes
+    # the ones it skipped and returns them
+    def __init__(self, reddit, batches):
+        super().__init__(batches[0] if batches else [])
+        self._reddit = reddit
+        self._more = list(batches[1:])
+
+    def replace_more(self, limit=32):
+        replaced = 0
+        while self._more and (limit is None or replaced < limit):
+            self._reddit.simulate_request()
+            self.extend(self._more.pop(0))
+            replaced += 1
+        skipped, self._more = self._more, []
+        return skipped
+
+
+class FakeSubmissionRef:
+    def __init__(self, reddit, submission_id):
+        self._reddit = reddit
+        self.id = submission_id
+        self.fullname = "t3_" + submission_id
+        self._comments = None
+
+    @property
+    def comments(self):
+        if self._comments is None:
+            self._reddit.simulate_request()
+            self._comments = FakeCommentForest(self._reddit, self._reddit.comment_batches(self.fullname))
+        return self._comments
+
+
+class FakeSubreddit:
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self.display_name = name
+
+    def _listing(self, limit=100, params=None, **kwargs):
+        posts = self._reddit.posts_for(self.display_name)
+        limit = len(posts) if limit is None else min(limit, len(posts))
+        for index in range(limit):
+            if index % PAGE_SIZE == 0:
+                self._reddit.simulate_request()
+            yield posts[index]
+
+    new = hot = rising = _listing
+
+    def top(self, time_filter="all", limit=100, params=None, **kwargs):
+        return self._listing(limit=limit, params=params)
+
+    def controversial(self, time_filter="all", limit=100, params=None, **kwargs):
+        return self._listing(limit=limit, params=params)
+
+
+class FakeAuth:
+    def __init__(self, reddit):
+        self._reddit = reddit
+
+    @property
+    def limits(self):
+        return {
+            "remaining": max(0, 1000 - self._reddit.requests),
+            "used": self._reddit.requests,
+            "reset_timestamp": time.time() + 600,
+        }
+
+
+class FakeReddit:
+    def __init__(self, posts_per_subreddit=100, latency=0.0, seed=0, comments_per_submission=50):
+        self.posts_per_subreddit = posts_per_subreddit
+        self.comments_per_submission = comments_per_submission
+        self.latency = latency
+        self.seed = seed
+        self.requests = 0
+        self.auth = FakeAuth(self)
+        self._posts = {}
+        self._lock = threading.Lock()
+        self._next_number = 1
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name)
+
+    def submission(self, id):
+        return FakeSubmissionRef(self, id)
+
+    def comment_batches(self, post_fullname):
+        # Deterministic comment tree for a post: comments_per_submission comments, about
+        # half of them replies up to three levels deep, split into MORE_BATCH-sized
+        # top-level batches
+        rng = random.Random("%s:%s" % (self.seed, post_fullname))
+        top_level = []
+        comments = []
+        for number in range(self.comments_per_submission):
+            fullname = "t1_%s_%x" % (post_fullname[3:], number)
+            parents = [comment for comment in comments[-10:] if comment.depth < 3]
+            if parents and rng.random() < 0.5:
+                parent = rng.choice(parents)
+                comment = FakeComment(fullname, parent.fullname, 1700000000 + number, rng)
+                comment.depth = parent.depth + 1
+                parent.replies.append(comment)
+            else:
+                comment = FakeComment(fullname, post_fullname, 1700000000 + number, rng)
+                comment.depth = 0
+                top_level.append(comment)
+            comments.append(comment)
+        return [top_level[index:index + MORE_BATCH] for index in range(0, len(top_level), MORE_BATCH)]
+
+    def simulate_request(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def simulate_request_async(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def posts_for(self, name):
+        # newest first, like /new
+        with self._lock:
+            if name not in self._posts:
+                self._posts[name] = []
+                self._add_posts(name, self.posts_per_subreddit)
+            return self._posts[name]
+
+    def add_posts(self, name, count):
+        # simulates new submissions arriving, for incremental refresh benchmarks
+        self.posts_for(name)
+        with self._lock:
+            self._add_posts(name, count)
+
+    def _add_posts(self, name, count):
+        rng = random.Random("%s:%s:%d" % (self.seed, name, len(self._posts[name])))
+        newest = self._posts[name][0].created_utc if self._posts[name] else 1700000000
+        new_posts = []
+        for offset in range(count):
+            new_posts.append(FakeSubmission(name, self._next_number, newest + count - offset, rng))
+            self._next_number += 1
+        self._posts[name] = new_posts + self._posts[name]
+
+
+class FakeAsyncSubreddit:
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self.display_name = name
+
+    async def _listing(self, limit=100, params=None, **kwargs):
+        posts = self._reddit.posts_for(self.display_name)
+        limit = len(posts) if limit is None else min(limit, len(posts))
+        for index in range(limit):
+            if index % PAGE_SIZE == 0:
+                await self._reddit.simulate_request_async()
+            yield posts[index]
+
+    new = hot = rising = _listing
+
+    def top(self, time_filter="all", limit=100, params=None, **kwargs):
+        return self._listing(limit=limit, params=params)
+
+    def controversial(self, time_filter="all", limit=100, params=None, **kwargs):
+        return self._listing(limit=limit, params=params)
+
+
+class FakeAsyncReddit:
+    # Shares posts, latency and the request count with the FakeReddit it wraps
+    def __init__(self, reddit):
+        self._reddit = reddit
+        self.auth = reddit.auth
+
+    async def subreddit(self, name):
+        return FakeAsyncSubreddit(self._reddit, name)
+
+    async def close(self):
+        pass
@@ -0,0 +1,518 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models.db_models import KeywordData, KeywordPost, PRAWLogData, PostData  # noqa: E402
+from app.services import async_keyword_services, keyword_services  # noqa: E402
+from app.services.cache import keyword_cache  # noqa: E402
+from app.services.comment_services import ingest_comments  # noqa: E402
+from app.services.rate_limit import TokenBucket  # noqa: E402
+from app.services.reddit_clients import RedditClient, reddit_clients  # noqa: E402
+from benchmarks.fake_reddit import FakeAsyncReddit, FakeReddit  # noqa: E402
+from config import Config  # noqa: E402
+
+# Offline benchmark suite. Runs the real app against a throwaway SQLite database with
+# the Reddit client pool swapped for FakeReddit, and writes machine-readable results so runs can
+# be compared with benchmarks/compare.py.
+#
+#   python -m benchmarks.run_benchmarks --output before.json
+#   python -m benchmarks.compare before.json after.json
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def pick(fraction):
+        return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))]
+
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": pick(0.50) * 1000,
+        "p90_ms": pick(0.90) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def make_app(database_path):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + database_path
+        INGESTION_MODE = "inline"
+        KEYWORD_CACHE_TTL = 24 * 3600  # keep warm reads from triggering refreshes
+
+    return create_app(BenchmarkConfig)
+
+
+def use_fake_reddit(fake):
+    # no client-side rate limit: measure the app, not the token bucket
+    reddit_clients.replace([RedditClient(fake, "fake", TokenBucket(1e9, 1e9), async_reddit=FakeAsyncReddit(fake))])
+
+
+STARTUP_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from config import Config
+from app import create_app
+imported = time.perf_counter()
+
+class StartupConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + sys.argv[2]
+
+create_app(StartupConfig)
+print(json.dumps({"import": imported - started, "create_app": time.perf_counter() - imported}))
+"""
+
+
+def bench_startup(workdir, runs):
+    # Boot cost of a fresh process, as a gunicorn worker or autoscaled instance pays it:
+    # importing the app plus create_app(), once against a new database file and then
+    # against an existing one
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    database_path = os.path.join(workdir, "startup.db")
+
+    def boot():
+        started = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", STARTUP_SNIPPET, root, database_path], text=True)
+        timings = json.loads(output.strip().splitlines()[-1])
+        timings["process"] = time.perf_counter() - started
+        return timings
+
+    first = boot()
+    warm = [boot() for _ in range(runs)]
+    return {
+        "new_database": {name: value * 1000 for name, value in first.items()},
+        "existing_database": {
+            name: percentiles([timings[name] for timings in warm]) for name in ("import", "create_app", "process")
+        },
+    }
+
+
+def bench_keyword_data(app, fake, keywords, warm_requests):
+    # /keyword_data latency for first (cold, fetches from Reddit) and repeated (warm) reads
+    client = app.test_client()
+    cold, warm = [], []
+    names = ["bench_kw_%d" % index for index in range(keywords)]
+    for name in names:
+        elapsed, response = timed(lambda: client.get(
+            "/keyword_data", query_string={"keyword": name, "account_name": "bench", "industry": "bench"}
+        ))
+        assert response.status_code == 200, response.data
+        cold.append(elapsed)
+    for _ in range(warm_requests):
+        for name in names:
+            elapsed, response = timed(lambda: client.get("/keyword_data", query_string={"keyword": name}))
+            assert response.status_code == 200, response.data
+            warm.append(elapsed)
+    return {
+        "fake_latency_s": fake.latency,
+        "cold": percentiles(cold),
+        "warm": percentiles(warm),
+    }
+
+
+def bench_ingestion(app, keywords, posts_per_keyword):
+    # Posts/sec stored by fetch_and_store_reddit_data, with zero
+    # simulated network latency so only the app and db side is measured
+    fake = FakeReddit(posts_per_subreddit=posts_per_keyword, latency=0)
+    use_fake_reddit(fake)
+    app.config["REDDIT_FETCH_LIMIT"] = posts_per_keyword
+    total = 0
+    with app.app_context():
+        started = time.perf_counter()
+        for index in range(keywords):
+            keyword_data = keyword_services.add_keyword_data("bench_ingest_%d" % index, "bench", "bench")
+            total += keyword_services.fetch_and_store_reddit_data(keyword_data.keyword, keyword_data.id)
+        elapsed = time.perf_counter() - started
+    return {
+        "keywords": keywords,
+        "posts": total,
+        "seconds": elapsed,
+        "posts_per_sec": total / elapsed if elapsed else None,
+        "reddit_requests": fake.requests,
+    }
+
+
+def bench_comments(app, posts, comments_per_post):
+    # Comments/sec through the comment-tree stage (fetch, expand, bulk upsert), with
+    # zero simulated latency
+    fake = FakeReddit(posts_per_subreddit=posts, latency=0, comments_per_submission=comments_per_post)
+    use_fake_reddit(fake)
+    with app.app_context():
+        keyword_data = keyword_services.add_keyword_data("bench_comments", "bench", "bench")
+        keyword_services.fetch_and_store_reddit_data(
+            keyword_data.keyword, keyword_data.id, listings=[{"listing": "new", "limit": posts}]
+        )
+        requests_before = fake.requests
+        started = time.perf_counter()
+        posts_done, comments = ingest_comments(limit=posts)
+        elapsed = time.perf_counter() - started
+    return {
+        "posts": posts_done,
+        "comments": comments,
+        "seconds": elapsed,
+        "comments_per_sec": comments / elapsed if elapsed else None,
+        "reddit_requests": fake.requests - requests_before,
+    }
+
+
+def fill_praw_logs(app, rows, chunk=50000):
+    with app.app_context():
+        db.session.query(PRAWLogData).delete()
+        db.session.commit()
+        start = datetime(2024, 1, 1)
+        levels = ("DEBUG", "DEBUG", "DEBUG", "INFO", "WARNING")
+        for offset in range(0, rows, chunk):
+            db.session.execute(PRAWLogData.__table__.insert(), [
+                {
+                    "log": "Fetching: GET https://oauth.reddit.com/r/bench/new at %d" % index,
+                    "level": levels[index % len(levels)],
+                    "timestamp": start + timedelta(milliseconds=index * 100),
+                }
+                for index in range(offset, min(rows, offset + chunk))
+            ])
+            db.session.commit()
+
+
+def bench_praw_logs(app, sizes, repeats):
+    client = app.test_client()
+    results = {}
+    for size in sizes:
+        fill_praw_logs(app, size)
+        page = [timed(lambda: client.get("/praw_logs"))[0] for _ in range(repeats)]
+        filtered = [
+            timed(lambda: client.get("/praw_logs", query_string={"level": "warning", "since": "2024-01-01T00:10:00"}))[0]
+            for _ in range(repeats)
+        ]
+        elapsed, response = timed(lambda: client.get("/praw_logs", query_string={"format": "ndjson"}).get_data())
+        results[str(size)] = {
+            "first_page": percentiles(page),
+            "filtered_page": percentiles(filtered),
+            "ndjson_full_stream": {
+                "seconds": elapsed,
+                "bytes": len(response),
+                "rows_per_sec": size / elapsed if elapsed else None,
+            },
+        }
+    return results
+
+
+def bench_concurrent_writes(app, client_counts, batches, batch_size):
+    # Post store rate with several threads, each with its own session
+    results = {}
+    for clients in client_counts:
+        errors = []
+        fake = FakeReddit(posts_per_subreddit=batch_size, latency=0)
+
+        def writer(index):
+            try:
+                with app.app_context():
+                    keyword_data = keyword_services.get_or_create_keyword_data(
+                        "bench_writer_%d_%d" % (clients, index), "bench", "bench"
+                    )
+                    for batch in range(batches):
+                        fake.add_posts("writer_%d_%d" % (clients, index), batch_size)
+                        rows = [
+                            {
+                                "reddit_id": post.fullname,
+                                "subreddit": post.subreddit.display_name,
+                                "comment": post.selftext or "No comments",
+                                "created_date": datetime.utcfromtimestamp(post.created_utc),
+                                "author": post.author.name if post.author else "Unknown",
+                                "title": post.title,
+                                "keyword_data_id": keyword_data.id,
+                            }
+                            for post in fake.posts_for("writer_%d_%d" % (clients, index))[:batch_size]
+                        ]
+                        keyword_services.store_posts(rows)
+                        db.session.commit()
+            except Exception as exc:
+                errors.append(repr(exc))
+
+        threads = [threading.Thread(target=writer, args=(index,)) for index in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        rows = clients * batches * batch_size
+        results[str(clients)] = {
+            "rows": rows,
+            "commits": clients * batches,
+            "seconds": elapsed,
+            "rows_per_sec": rows / elapsed if elapsed else None,
+            "commits_per_sec": clients * batches / elapsed if elapsed else None,
+            "errors": errors,
+        }
+    return results
+
+
+def bench_stats(app, sizes, repeats):
+    # /stats (materialized rollups) against the GROUP BY over the stored posts it replaces,
+    # as the post table grows; posts are spread over 10 keywords, 5 industries, 50
+    # subreddits and 90 days
+    client = app.test_client()
+    results = {}
+    stored = 0
+    with app.app_context():
+        keywords = [
+            keyword_services.get_or_create_keyword_data("bench_stats_%d" % index, "account%d" % index, "industry%d" % (index % 5))
+            for index in range(10)
+        ]
+        keyword_ids = [keyword_data.id for keyword_data in keywords]
+    start = datetime(2024, 1, 1)
+    for size in sizes:
+        with app.app_context():
+            started = time.perf_counter()
+            for offset in range(stored, size, 5000):
+                keyword_services.store_posts([
+                    {
+                        "reddit_id": "t3_stats%x" % index,
+                        "subreddit": "sub%d" % (index % 50),
+                        "comment": "No comments",
+                        "created_date": start + timedelta(seconds=index * 90 * 86400 // size),
+                        "author": "user%d" % (index % 2000),
+                        "title": "Synthetic post %d" % index,
+                        "keyword_data_id": keyword_ids[index % 10],
+                    }
+                    for index in range(offset, min(size, offset + 5000))
+                ])
+                db.session.commit()
+            ingest_seconds = time.perf_counter() - started
+            raw_query = (
+                db.session.query(
+                    KeywordData.industry,
+                    db.func.date(PostData.created_date),
+                    db.func.count(PostData.id),
+                    db.func.count(db.func.distinct(PostData.author)),
+                    db.func.min(PostData.created_date),
+                    db.func.max(PostData.created_date),
+                )
+                .select_from(KeywordPost)
+                .join(PostData, PostData.id == KeywordPost.post_id)
+                .join(KeywordData, KeywordPost.keyword_data_id == KeywordData.id)
+                .filter(KeywordData.industry == "industry1")
+                .group_by(KeywordData.industry, db.func.date(PostData.created_date))
+            )
+            raw = [timed(raw_query.all)[0] for _ in range(repeats)]
+        stats = [
+            timed(lambda: client.get("/stats", query_string={"group": "industry", "value": "industry1"}))[0]
+            for _ in range(repeats)
+        ]
+        results[str(size)] = {
+            "ingest_posts_per_sec": (size - stored) / ingest_seconds if ingest_seconds else None,
+            "stats_endpoint": percentiles(stats),
+            "raw_group_by": percentiles(raw),
+        }
+        stored = size
+    return results
+
+
+async def asgi_get(asgi_app, path, query):
+    # One GET through an ASGI app in-process, like app.test_client() for Flask;
+    # returns (status, body)
+    messages = []
+    received = []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app({
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(query).encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 0),
+    }, receive, send)
+    return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def bench_serving_modes(app, latency, concurrency_levels, sync_threads):
+    # A burst of concurrent cold /keyword_data requests, each a Reddit fetch taking
+    # `latency` seconds per page: the Flask app on sync_threads threads (a WSGI server's
+    # workers x threads) against the async serving mode on one event loop. Latencies
+    # are from the start of the burst, so they include queueing for a thread.
+    from app.asgi import AsyncKeywordApp
+
+    fake = FakeReddit(posts_per_subreddit=app.config["REDDIT_FETCH_LIMIT"], latency=latency)
+    with app.app_context():
+        async_keyword_services.configure(app)
+    asgi_app = AsyncKeywordApp(app)
+
+    def query(mode, concurrency, index):
+        return {"keyword": "bench_%s_%d_%d" % (mode, concurrency, index), "account_name": "bench", "industry": "bench"}
+
+    def summary(started, finished):
+        seconds = max(finished) - started
+        return {
+            "seconds": seconds,
+            "requests_per_sec": len(finished) / seconds if seconds else None,
+            "latency": percentiles([at - started for at in finished]),
+        }
+
+    results = {}
+    for concurrency in concurrency_levels:
+        use_fake_reddit(fake)
+        keyword_cache.clear()
+
+        def sync_get(index):
+            response = app.test_client().get("/keyword_data", query_string=query("sync", concurrency, index))
+            assert response.status_code == 200, response.data
+            return time.perf_counter()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sync_threads) as executor:
+            finished = list(executor.map(sync_get, range(concurrency)))
+        results[str(concurrency)] = {"sync": summary(started, finished)}
+
+        async def async_burst():
+            async def async_get(index):
+                status, body = await asgi_get(asgi_app, "/keyword_data", query("async", concurrency, index))
+                assert status == 200, body
+                return time.perf_counter()
+
+            try:
+                return await asyncio.gather(*(async_get(index) for index in range(concurrency)))
+            finally:
+                with app.app_context():
+                    await async_keyword_services.shutdown()
+
+        started = time.perf_counter()
+        finished = asyncio.run(async_burst())
+        results[str(concurrency)]["async"] = summary(started, finished)
+    return {
+        "fake_latency_s": latency,
+        "sync_threads": sync_threads,
+        "async_write_threads": app.config["ASYNC_WRITE_THREADS"],
+        "concurrency": results,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks with a fake Reddit backend")
+    parser.add_argument("--output", "-o", default="benchmark-results.json")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per Reddit request")
+    parser.add_argument("--keywords", type=int, default=50, help="Keywords for the /keyword_data benchmark")
+    parser.add_argument("--warm-requests", type=int, default=5, help="Warm reads per keyword")
+    parser.add_argument("--ingest-keywords", type=int, default=20)
+    parser.add_argument("--ingest-posts", type=int, default=500, help="Posts fetched per keyword")
+    parser.add_argument("--comment-posts", type=int, default=50, help="Posts whose comment trees are ingested")
+    parser.add_argument("--comments-per-post", type=int, default=500)
+    parser.add_argument("--log-rows", default="10000,1000000", help="Comma-separated PRAWLogData table sizes")
+    parser.add_argument("--repeats", type=int, default=20, help="Requests per /praw_logs measurement")
+    parser.add_argument("--clients", default="1,4,8", help="Comma-separated concurrent writer counts")
+    parser.add_argument("--write-batches", type=int, default=20)
+    parser.add_argument("--write-batch-size", type=int, default=100)
+    parser.add_argument("--stats-posts", default="10000,200000", help="Comma-separated post counts for the /stats benchmark")
+    parser.add_argument("--startup-runs", type=int, default=10, help="Process boots for the startup benchmark")
+    parser.add_argument("--serving-concurrency", default="50,500",
+                        help="Comma-separated burst sizes of concurrent cold /keyword_data requests")
+    parser.add_argument("--serving-latency", type=float, default=0.5,
+                        help="Simulated seconds per Reddit request in the serving benchmark")
+    parser.add_argument("--sync-threads", type=int, default=16, help="Request threads for the sync path")
+    parser.add_argument("--only", default=None,
+                        help="Comma-separated subset of: startup,keyword_data,ingestion,comments,praw_logs,"
+                             "concurrent_writes,stats,serving")
+    args = parser.parse_args(argv)
+    selected = set(args.only.split(",")) if args.only else None
+
+    def wanted(name):
+        return selected is None or name in selected
+
+    workdir = tempfile.mkdtemp(prefix="reddit-connector-bench-")
+    results = {}
+    if wanted("startup"):
+        results["startup"] = bench_startup(workdir, args.startup_runs)
+    app = make_app(os.path.join(workdir, "bench.db"))
+
+    if wanted("keyword_data"):
+        fake = FakeReddit(posts_per_subreddit=app.config["REDDIT_FETCH_LIMIT"], latency=args.latency)
+        use_fake_reddit(fake)
+        keyword_cache.clear()
+        results["keyword_data"] = bench_keyword_data(app, fake, args.keywords, args.warm_requests)
+    if wanted("ingestion"):
+        results["ingestion"] = bench_ingestion(app, args.ingest_keywords, args.ingest_posts)
+    if wanted("comments"):
+        results["comments"] = bench_comments(app, args.comment_posts, args.comments_per_post)
+    if wanted("praw_logs"):
+        sizes = [int(size) for size in args.log_rows.split(",") if size]
+        results["praw_logs"] = bench_praw_logs(app, sizes, args.repeats)
+    if wanted("concurrent_writes"):
+        counts = [int(count) for count in args.clients.split(",") if count]
+        results["concurrent_writes"] = bench_concurrent_writes(
+            app, counts, args.write_batches, args.write_batch_size
+        )
+
+    if wanted("stats"):
+        sizes = [int(size) for size in args.stats_posts.split(",") if size]
+        results["stats"] = bench_stats(app, sizes, args.repeats)
+    if wanted("serving"):
+        levels = [int(level) for level in args.serving_concurrency.split(",") if level]
+        results["serving"] = bench_serving_modes(app, args.serving_latency, levels, args.sync_threads)
+
+    with app.app_context():
+        keyword_count = KeywordData.query.count()
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "arguments": vars(args),
+            "keywords_created": keyword_count,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print("Wrote %s" % args.output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
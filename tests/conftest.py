@@ -0,0 +1,44 @@
+import os
+import sys
+import pytest
+
+# lets the tests import app and config the way run.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.services.cache import clear_caches  # noqa: E402
+from benchmarks.fake_reddit import FakeReddit  # noqa: E402
+from benchmarks.run_benchmarks import use_fake_reddit  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def make_config(database_path, **settings):
+    # Config for an app on its own SQLite file, serving inline fetches
+    attributes = {
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(database_path),
+        "INGESTION_MODE": "inline",
+    }
+    attributes.update(settings)
+    return type("TestConfig", (Config,), attributes)
+
+
+@pytest.fixture
+def app(tmp_path):
+    clear_caches()
+    app = create_app(make_config(tmp_path / "test.db"))
+    yield app
+    clear_caches()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def fake_reddit(app):
+    # Reddit replaced by the benchmarks' in-memory fake (after create_app, which builds
+    # the real client pool); fake.requests counts the calls
+    fake = FakeReddit(posts_per_subreddit=30, latency=0, comments_per_submission=5)
+    use_fake_reddit(fake)
+    return fake
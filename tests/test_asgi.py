@@ -0,0 +1,88 @@
+import asyncio
+import json
+from app.asgi import create_asgi_app
+from app.services import async_keyword_services, shared_state
+from benchmarks.fake_reddit import FakeReddit
+from benchmarks.run_benchmarks import use_fake_reddit
+from conftest import make_config
+
+
+async def call(asgi_app, query, headers=(), disconnect_after=None):
+    # One GET /keyword_data; returns (status, headers, body), or None if the client
+    # disconnected first
+    scope = {
+        "type": "http", "method": "GET", "path": "/keyword_data", "query_string": query.encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+    }
+    sent = []
+
+    async def receive():
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    if not sent:
+        return None
+    return sent[0]["status"], dict(sent[0]["headers"]), sent[1]["body"]
+
+
+def run(tmp_path, scenario, latency=0):
+    asgi_app = create_asgi_app(make_config(tmp_path / "asgi.db"))
+    fake = FakeReddit(posts_per_subreddit=30, latency=latency)
+    use_fake_reddit(fake)
+
+    async def main():
+        try:
+            return await scenario(asgi_app, fake)
+        finally:
+            with asgi_app.flask_app.app_context():
+                await async_keyword_services.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_cold_fetch_then_304(tmp_path):
+    async def scenario(asgi_app, fake):
+        status, headers, body = await call(asgi_app, "keyword=pizza&account_name=acme&industry=food")
+        assert status == 200
+        assert len(json.loads(body)) == 10
+
+        status, headers, body = await call(asgi_app, "keyword=pizza")
+        assert status == 200
+        requests = fake.requests
+        status, _, body = await call(asgi_app, "keyword=pizza", [("if-none-match", headers[b"etag"].decode())])
+        assert status == 304 and body == b""
+        assert fake.requests == requests
+
+        status, _, _ = await call(asgi_app, "keyword=tea")
+        assert status == 400
+
+    run(tmp_path, scenario)
+
+
+def test_concurrent_cold_requests_share_one_fetch(tmp_path):
+    async def scenario(asgi_app, fake):
+        results = await asyncio.gather(*[
+            call(asgi_app, "keyword=pizza&account_name=acme&industry=food") for _ in range(5)
+        ])
+        assert [status for status, _, _ in results] == [200] * 5
+        assert fake.requests == 1
+
+    run(tmp_path, scenario, latency=0.2)
+
+
+def test_disconnect_cancels_the_fetch_and_releases_the_lease(tmp_path):
+    async def scenario(asgi_app, fake):
+        result = await call(asgi_app, "keyword=pizza&account_name=acme&industry=food", disconnect_after=0.1)
+        assert result is None
+        await asyncio.sleep(0.1)  # the cancelled fetch releases its lease on the write pool
+        with asgi_app.flask_app.app_context():
+            assert not await async_keyword_services.run_sync(shared_state.backend().lease_held, "keyword:pizza")
+            assert await async_keyword_services.get_keyword_version("pizza") is None
+
+    run(tmp_path, scenario, latency=0.5)
@@ -0,0 +1,47 @@
+import gzip
+import json
+from app.models.db_models import KeywordData
+from app.services.keyword_services import fetch_and_store_reddit_data
+
+NEW_KEYWORD = {"keyword": "pizza", "account_name": "acme", "industry": "food"}
+
+
+def test_unchanged_keyword_gets_304(client, fake_reddit):
+    posts = client.get("/keyword_data", query_string=NEW_KEYWORD).json
+    response = client.get("/keyword_data?keyword=pizza")
+    assert response.status_code == 200
+    assert response.json == posts
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+    assert etag.startswith("W/")
+
+    requests = fake_reddit.requests
+    response = client.get("/keyword_data?keyword=pizza", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    response = client.get("/keyword_data?keyword=pizza", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    assert fake_reddit.requests == requests
+
+
+def test_new_posts_change_the_etag(client, app, fake_reddit):
+    client.get("/keyword_data", query_string=NEW_KEYWORD)
+    etag = client.get("/keyword_data?keyword=pizza").headers["ETag"]
+
+    fake_reddit.add_posts("pizza", 3)
+    with app.app_context():
+        keyword_data = KeywordData.query.filter_by(keyword="pizza").one()
+        fetch_and_store_reddit_data("pizza", keyword_data.id)
+    response = client.get("/keyword_data?keyword=pizza", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json) == 13  # REDDIT_FETCH_LIMIT on the first fetch, then the new ones
+
+
+def test_body_is_compressed_when_asked(client, fake_reddit):
+    client.get("/keyword_data", query_string=NEW_KEYWORD)
+    plain = client.get("/keyword_data?keyword=pizza")
+    response = client.get("/keyword_data?keyword=pizza", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.data)) == plain.json
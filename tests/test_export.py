@@ -0,0 +1,39 @@
+import gzip
+import io
+import json
+import pyarrow.parquet as pq
+
+
+def fetch(client, keyword):
+    response = client.get("/keyword_data", query_string={"keyword": keyword, "account_name": "acme", "industry": "food"})
+    assert response.status_code == 200
+    return response.json
+
+
+def test_ndjson_export_has_one_row_per_stored_post(client, fake_reddit):
+    posts = fetch(client, "pizza")
+    response = client.get("/export?format=ndjson&keyword=pizza")
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(rows) == len(posts)
+    assert {row["keyword"] for row in rows} == {"pizza"}
+    assert all("T" in row["created_date"] for row in rows)
+
+    response = client.get("/export?format=ndjson&compression=gzip&keyword=pizza")
+    assert gzip.decompress(response.data).decode().count("\n") == len(posts)
+
+
+def test_parquet_export(client, fake_reddit):
+    posts = fetch(client, "pizza")
+    response = client.get("/export?format=parquet&compression=zstd")
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.data))
+    assert table.num_rows == len(posts)
+
+
+def test_unknown_compression_is_rejected_before_streaming(client, fake_reddit):
+    fetch(client, "pizza")
+    response = client.get("/export?format=parquet&compression=bogus")
+    assert response.status_code == 400
+    assert "bogus" in response.json["message"]
+    assert client.get("/export?format=csv&compression=zstd").status_code == 400
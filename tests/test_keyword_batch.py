@@ -0,0 +1,44 @@
+from app.models.db_models import KeywordData
+
+
+def post_batch(client, payload):
+    return client.post("/keyword_data/batch", json=payload)
+
+
+def test_batch_fetches_new_keywords_once(client, app, fake_reddit):
+    response = post_batch(client, {"keywords": ["pizza", "coffee", "pizza"], "account_name": "acme", "industry": "food"})
+    assert response.status_code == 200
+    assert [(row["keyword"], row["status"]) for row in response.json] == [("pizza", "fetched"), ("coffee", "fetched")]
+    assert all(row["count"] > 0 for row in response.json)
+
+    requests = fake_reddit.requests
+    response = post_batch(client, {"keywords": ["pizza"]})
+    assert response.json[0]["status"] == "cached"
+    assert fake_reddit.requests == requests
+
+
+def test_batch_rejects_keywords_that_are_not_a_list_of_strings(client, app, fake_reddit):
+    for keywords in ("pizza", [1, {"x": 1}], {"pizza": 1}):
+        response = post_batch(client, {"keywords": keywords, "account_name": "acme", "industry": "food"})
+        assert response.status_code == 400, keywords
+    assert post_batch(client, {"keywords": []}).status_code == 400
+    assert client.post("/keyword_data/batch", json=["pizza"]).status_code == 400
+    assert fake_reddit.requests == 0
+    with app.app_context():
+        assert KeywordData.query.count() == 0
+
+
+def test_batch_reports_invalid_keywords_without_calling_reddit(client, app, fake_reddit):
+    response = post_batch(client, {"keywords": ["bad name!", "_pizza", "coffee"], "account_name": "acme", "industry": "food"})
+    assert response.status_code == 200
+    statuses = {row["keyword"]: row["status"] for row in response.json}
+    assert statuses == {"bad name!": "invalid", "_pizza": "invalid", "coffee": "fetched"}
+
+    # new keywords need an account_name and industry to be registered
+    requests = fake_reddit.requests
+    response = post_batch(client, {"keywords": ["tea"]})
+    assert response.json[0]["status"] == "invalid"
+    assert response.json[0]["error"] == "missing account_name"
+    assert fake_reddit.requests == requests
+    with app.app_context():
+        assert sorted(k.keyword for k in KeywordData.query) == ["coffee"]
@@ -0,0 +1,50 @@
+import io
+import json
+from app import db
+from app.models.db_models import KeywordData
+
+
+def registered(app):
+    with app.app_context():
+        return {k.keyword: (k.account_name, k.industry) for k in KeywordData.query}
+
+
+def test_csv_upload_reports_every_row(client, app):
+    with app.app_context():
+        db.session.add(KeywordData(keyword="pizza", account_name="acme", industry="food"))
+        db.session.add(KeywordData(keyword="coffee", account_name="acme", industry="drinks"))
+        db.session.commit()
+    data = (
+        "keyword,account_name,industry\n"
+        "pizza,acme,food\n"
+        "coffee,acme,food\n"
+        "tea,,\n"
+        "bad name!,acme,food\n"
+        "tea,other,food\n"
+    )
+    response = client.post(
+        "/keyword_data/import?account_name=acme&industry=food",
+        data={"file": (io.BytesIO(data.encode()), "keywords.csv")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    report = response.json
+    assert [row["status"] for row in report["rows"]] == ["unchanged", "updated", "created", "invalid", "duplicate"]
+    assert (report["created"], report["updated"], report["unchanged"], report["invalid"], report["duplicate"]) == (1, 1, 1, 1, 1)
+    assert registered(app) == {"pizza": ("acme", "food"), "coffee": ("acme", "food"), "tea": ("acme", "food")}
+
+
+def test_json_body_and_dry_run(client, app):
+    payload = {"keywords": ["pizza", {"keyword": "coffee", "industry": "drinks"}], "account_name": "acme", "industry": "food"}
+    response = client.post("/keyword_data/import?dry_run=true", data=json.dumps(payload), content_type="application/json")
+    assert response.json["created"] == 2 and response.json["dry_run"] is True
+    assert registered(app) == {}
+
+    client.post("/keyword_data/import", data=json.dumps(payload), content_type="application/json")
+    assert registered(app) == {"pizza": ("acme", "food"), "coffee": ("acme", "drinks")}
+
+
+def test_malformed_upload_is_rejected(client, app):
+    assert client.post("/keyword_data/import", data="{not json", content_type="application/json").status_code == 400
+    response = client.post("/keyword_data/import?format=csv", data="name\npizza\n", content_type="text/csv")
+    assert response.status_code == 400
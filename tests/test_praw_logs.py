@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timedelta
+from app import db
+from app.models.db_models import PRAWLogData
+from app.utils import PRAWLogHandler, configure_praw_logging
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def add_logs(app, count):
+    # several rows share each timestamp, so paging has to tie-break on id
+    with app.app_context():
+        db.session.add_all(
+            PRAWLogData(log="log %d" % number, level="DEBUG" if number % 2 else "WARNING",
+                        timestamp=START + timedelta(minutes=number // 3))
+            for number in range(count)
+        )
+        db.session.commit()
+
+
+def test_cursor_pages_through_every_log_once_newest_first(client, app):
+    add_logs(app, 25)
+    seen = []
+    cursor = None
+    while True:
+        response = client.get("/praw_logs", query_string={"limit": 10, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen.extend(response.json)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert len(seen) == 25
+    assert len({row["log"] for row in seen}) == 25
+    order = [(row["timestamp"], row["id"]) for row in seen]
+    assert order == sorted(order, reverse=True)
+
+
+def test_filters_and_ndjson(client, app):
+    add_logs(app, 9)
+    response = client.get("/praw_logs?level=warning&format=ndjson")
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(rows) == 5 and {row["level"] for row in rows} == {"WARNING"}
+
+    # 13:01+01:00 is 12:01 UTC: the logs from minute 1 on
+    response = client.get("/praw_logs", query_string={"since": "2024-01-01T13:01:00+01:00"})
+    assert len(response.json) == 6
+
+
+def test_invalid_cursor_is_rejected(client, app):
+    assert client.get("/praw_logs?cursor=nonsense").status_code == 400
+
+
+class FailingEngine:
+    # stands in for the handler's engine while the database is unreachable
+    def begin(self):
+        raise OSError("database is down")
+
+    def dispose(self):
+        pass
+
+
+def test_failed_write_does_not_count_the_dropped_summary(app):
+    handler = PRAWLogHandler(FailingEngine(), PRAWLogData.__table__, capacity=1, flush_interval=60)
+    handler.close()  # the writer is stopped, so the test drives _write itself
+    handler._count_dropped(3)
+    handler._write([{"log": "a", "level": "DEBUG", "timestamp": START}])
+    # the record in the batch is lost too, the summary row is not
+    assert handler.dropped == 4
+
+    with app.app_context():
+        handler.engine = db.engine
+        handler._write([])
+    with app.app_context():
+        summary = PRAWLogData.query.filter_by(level="WARNING").one()
+    # the next summary reports every drop, including those of the failed write
+    assert summary.log == "PRAWLogHandler queue full, dropped 4 log records"
+    assert handler.dropped == 4
+
+
+def test_reconfiguring_disposes_the_old_engine(app):
+    with app.app_context():
+        first = configure_praw_logging()
+        disposed = []
+        first.engine.dispose = lambda: disposed.append(True)
+        configure_praw_logging().close()
+    assert disposed
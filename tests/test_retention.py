@@ -0,0 +1,63 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from app import db
+from app.models.db_models import CommentData, KeywordPost, PostData, PRAWLogData
+from app.services.comment_services import ingest_comments
+from app.services.retention import run_maintenance
+
+KEPT_POLICY = {"max_age_days": None, "max_rows": None}
+
+
+def read_archive(directory):
+    rows = []
+    for path in sorted(directory.iterdir()):
+        rows.extend(json.loads(line) for line in gzip.decompress(path.read_bytes()).decode().splitlines())
+    return rows
+
+
+def configure(app, tmp_path, **policies):
+    app.config["RETENTION_ARCHIVE_DIR"] = str(tmp_path / "archive")
+    app.config["RETENTION_BATCH_PAUSE"] = 0
+    app.config["RETENTION_DELETE_BATCH"] = 4
+    app.config["RETENTION_POLICIES"] = dict(
+        {name: KEPT_POLICY for name in ("praw_log_data", "ingestion_job", "post_data", "comment_data")}, **policies
+    )
+
+
+def test_expired_posts_take_their_links_and_comments(client, app, fake_reddit, tmp_path):
+    client.get("/keyword_data", query_string={"keyword": "pizza", "account_name": "acme", "industry": "food"})
+    configure(app, tmp_path, post_data={"max_age_days": None, "max_rows": 6})
+    with app.app_context():
+        ingest_comments()
+        oldest = [post.reddit_id for post in PostData.query.order_by(PostData.created_date).limit(4)]
+        comments_per_post = CommentData.query.filter(CommentData.post_reddit_id == oldest[0]).count()
+        assert comments_per_post > 0
+
+        report = run_maintenance(vacuum=False)
+        assert report["post_data"]["deleted"] == 4
+        assert report["post_data"]["comments_deleted"] == 4 * comments_per_post
+        assert PostData.query.count() == 6
+        assert KeywordPost.query.count() == 6
+        assert CommentData.query.filter(CommentData.post_reddit_id.in_(oldest)).count() == 0
+        assert CommentData.query.count() == 6 * comments_per_post
+
+    archived_posts = read_archive(tmp_path / "archive" / "post_data")
+    assert sorted(post["reddit_id"] for post in archived_posts) == sorted(oldest)
+    assert all(post["keyword_data_ids"] for post in archived_posts)
+    archived_comments = read_archive(tmp_path / "archive" / "comment_data")
+    assert {comment["post_reddit_id"] for comment in archived_comments} == set(oldest)
+
+
+def test_old_logs_are_archived_then_deleted(app, tmp_path):
+    configure(app, tmp_path, praw_log_data={"max_age_days": 7, "max_rows": None})
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all(PRAWLogData(log="old %d" % n, level="DEBUG", timestamp=now - timedelta(days=10 + n)) for n in range(5))
+        db.session.add(PRAWLogData(log="new", level="DEBUG", timestamp=now))
+        db.session.commit()
+        assert run_maintenance(dry_run=True)["praw_log_data"] == {"expired": 5, "archived": 0, "deleted": 0}
+        report = run_maintenance(vacuum=False)
+        assert report["praw_log_data"]["deleted"] == 5
+        assert [row.log for row in PRAWLogData.query] == ["new"]
+    assert len(read_archive(tmp_path / "archive" / "praw_log_data")) == 5
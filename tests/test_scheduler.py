@@ -0,0 +1,53 @@
+from app import create_app, db
+from app.models.db_models import IngestionJob, KeywordData, PostData
+from app.services.scheduler import run_ingestion_cycle
+from benchmarks.run_benchmarks import use_fake_reddit
+from conftest import make_config
+
+
+def make_worker(tmp_path, fake_reddit, **settings):
+    app = create_app(make_config(
+        tmp_path / "worker.db", INGESTION_MODE="worker", REDDIT_FETCH_LIMIT=500, INGEST_CHUNK_SIZE=100, **settings
+    ))
+    use_fake_reddit(fake_reddit)
+    fake_reddit.posts_per_subreddit = 500
+    with app.app_context():
+        for keyword in ("pizza", "coffee"):
+            db.session.add(KeywordData(keyword=keyword, account_name="acme", industry="food"))
+        db.session.commit()
+    return app
+
+
+def jobs(app):
+    with app.app_context():
+        return [(job.status, job.requests_used) for job in IngestionJob.query.order_by(IngestionJob.id)]
+
+
+def test_jobs_record_the_requests_they_made(tmp_path, fake_reddit):
+    app = make_worker(tmp_path, fake_reddit, INGEST_REQUEST_BUDGET=100)
+    assert run_ingestion_cycle(app) == 2
+    assert jobs(app) == [("succeeded", 5), ("succeeded", 5)]  # 500 posts, 100 per page
+    assert fake_reddit.requests == 10
+
+
+def test_budget_stops_a_fetch_at_its_next_request(tmp_path, fake_reddit):
+    app = make_worker(tmp_path, fake_reddit, INGEST_REQUEST_BUDGET=3)
+    assert run_ingestion_cycle(app) == 1
+    assert jobs(app) == [("partial", 3)]
+    assert fake_reddit.requests == 3
+    with app.app_context():
+        # the pages it did fetch are kept, but the keyword stays due
+        assert PostData.query.count() == 300
+        assert KeywordData.query.filter(KeywordData.last_fetched.is_(None)).count() == 2
+
+
+def test_comment_expansion_counts_against_the_budget(tmp_path, fake_reddit):
+    app = make_worker(
+        tmp_path, fake_reddit, INGEST_REQUEST_BUDGET=40, COMMENT_INGESTION=True, COMMENT_POSTS_PER_RUN=10,
+        COMMENT_MORE_BUDGET=4, REDDIT_LISTINGS=[{"listing": "new", "limit": 100}],
+    )
+    run_ingestion_cycle(app)
+    assert jobs(app) == [("succeeded", 1), ("succeeded", 1)]
+    # 38 left: each post takes 1 request plus its expansion budget of 4, so 7 posts fit
+    with app.app_context():
+        assert PostData.query.filter(PostData.comments_fetched.isnot(None)).count() == 7
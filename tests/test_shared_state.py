@@ -0,0 +1,66 @@
+from app import db
+from app.models.db_models import KeywordData
+from app.services import shared_state
+from app.services.singleflight import acquire_lease, fetch_lease, release_lease
+
+
+def test_values_are_versioned(app):
+    with app.app_context():
+        backend = shared_state.backend()
+        assert backend.get("colour") == (None, 0)
+        assert backend.set("colour", {"name": "red"}) == 1
+        assert backend.set("colour", {"name": "blue"}) == 2
+        assert backend.get("colour") == ({"name": "blue"}, 2)
+        assert backend.versions(["colour", "missing"]) == {"colour": 2, "missing": 0}
+
+
+def test_published_values_reach_watchers_on_sync(app):
+    seen = []
+    with app.app_context():
+        shared_state.watch("test_value", seen.append)
+        try:
+            shared_state.backend().set("test_value", [1, 2])  # as another process would
+            shared_state.sync(force=True)
+            shared_state.sync(force=True)
+        finally:
+            shared_state._watchers.pop("test_value")
+    assert seen == [[1, 2]]
+
+
+def test_lease_has_one_owner_at_a_time(app):
+    with app.app_context():
+        owner = acquire_lease("keyword:pizza")
+        assert owner is not None
+        assert acquire_lease("keyword:pizza") is None
+        assert shared_state.backend().lease_held("keyword:pizza")
+        release_lease("keyword:pizza", "someone else")
+        assert acquire_lease("keyword:pizza") is None
+        release_lease("keyword:pizza", owner)
+        assert not shared_state.backend().lease_held("keyword:pizza")
+        with fetch_lease("keyword:pizza") as acquired:
+            assert acquired
+            with fetch_lease("keyword:pizza") as acquired_again:
+                assert not acquired_again
+        assert acquire_lease("keyword:pizza") is not None
+
+
+def test_expired_lease_can_be_taken_over(app):
+    with app.app_context():
+        assert acquire_lease("keyword:pizza", ttl=-1) is not None
+        assert acquire_lease("keyword:pizza") is not None
+
+
+def test_backend_leaves_the_callers_transaction_alone(app):
+    with app.app_context():
+        db.session.add(KeywordData(keyword="pizza", account_name="acme", industry="food"))
+        db.session.flush()
+        shared_state.backend().versions(["colour"])
+        shared_state.backend().get("colour")
+        db.session.rollback()
+        assert KeywordData.query.count() == 0
+
+        db.session.add(KeywordData(keyword="coffee", account_name="acme", industry="food"))
+        with fetch_lease("keyword:coffee") as acquired:
+            assert acquired
+        db.session.commit()
+        assert [k.keyword for k in KeywordData.query] == ["coffee"]
@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+from app import create_app
+from app.services import shared_state
+from app.services.keyword_services import fetch_cold_keyword
+from app.services.singleflight import SingleFlight, acquire_lease, fetch_lease, renew_leases
+from benchmarks.run_benchmarks import use_fake_reddit
+from conftest import make_config
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "rows"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("pizza", fetch)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("pizza", fetch))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert calls == [1]
+    assert results == ["rows"] * 5
+
+
+def test_callers_share_the_error():
+    flights = SingleFlight()
+
+    def fail():
+        raise RuntimeError("reddit is down")
+
+    with pytest.raises(RuntimeError):
+        flights.do("pizza", fail)
+    assert flights.do("pizza", lambda: "recovered") == "recovered"
+
+
+def test_renewed_lease_outlives_its_ttl(app):
+    with app.app_context():
+        with fetch_lease("keyword:pizza", ttl=0.3) as acquired:
+            assert acquired
+            for _ in range(4):
+                time.sleep(0.15)
+                renew_leases()
+            # 0.6s in: without renewals another process could take it over by now
+            assert acquire_lease("keyword:pizza") is None
+        assert not shared_state.backend().lease_held("keyword:pizza")
+
+
+def test_long_cold_fetch_keeps_its_lease(tmp_path, fake_reddit):
+    # each page takes longer than a third of the TTL and the whole fetch several TTLs
+    app = create_app(make_config(
+        tmp_path / "lease.db", FETCH_LEASE_TTL=0.4, REDDIT_FETCH_LIMIT=500, INGEST_CHUNK_SIZE=100
+    ))
+    use_fake_reddit(fake_reddit)
+    fake_reddit.posts_per_subreddit = 500
+    fake_reddit.latency = 0.15
+
+    def fetch():
+        with app.app_context():
+            fetch_cold_keyword("pizza", "acme", "food")
+
+    fetcher = threading.Thread(target=fetch)
+    fetcher.start()
+    released = []
+    with app.app_context():
+        while not shared_state.backend().lease_held("keyword:pizza"):
+            time.sleep(0.01)
+        while fetcher.is_alive():
+            owner = acquire_lease("keyword:pizza")
+            if owner is not None:
+                released.append(owner)
+                break
+            time.sleep(0.05)
+    fetcher.join(10)
+    assert released == []
+    assert fake_reddit.requests == 5
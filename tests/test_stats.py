@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from app.models.db_models import DailyStats
+from app.services.keyword_services import get_or_create_keyword_data, store_fetched_chunk
+from app.services.rollup_services import get_daily_stats, rebuild_rollups
+
+
+def post_rows(count):
+    created = datetime(2024, 1, 1, 12)
+    return [
+        {
+            "reddit_id": "t3_%x" % number,
+            "subreddit": "python",
+            "comment": "body %d" % number,
+            "created_date": created + timedelta(minutes=number),
+            "author": "user%d" % (number % 3),
+            "title": "post %d" % number,
+        }
+        for number in range(count)
+    ]
+
+
+def counts(dimension):
+    return {row.value: (row.post_count, row.author_count) for row in get_daily_stats(dimension)}
+
+
+def test_overlapping_keywords_count_each_post_once_per_subreddit(app):
+    with app.app_context():
+        first = get_or_create_keyword_data("python", "acme", "software").id
+        second = get_or_create_keyword_data("learnpython", "acme", "education").id
+        store_fetched_chunk("python", first, post_rows(6))
+        # the second keyword fetches the same six posts plus two of its own
+        store_fetched_chunk("learnpython", second, post_rows(8))
+        # a re-fetch changes nothing
+        store_fetched_chunk("python", first, post_rows(6))
+
+        assert counts("subreddit") == {"python": (8, 3)}
+        assert counts("industry") == {"software": (6, 3), "education": (8, 3)}
+        assert counts("account_name") == {"acme": (14, 3)}
+
+
+def test_rebuild_matches_incremental_rollups(app):
+    with app.app_context():
+        first = get_or_create_keyword_data("python", "acme", "software").id
+        second = get_or_create_keyword_data("learnpython", "acme", "education").id
+        store_fetched_chunk("python", first, post_rows(6))
+        store_fetched_chunk("learnpython", second, post_rows(8))
+        incremental = {dimension: counts(dimension) for dimension in ("subreddit", "industry", "account_name")}
+
+        assert rebuild_rollups(chunk_size=3) == 8
+        assert DailyStats.query.count() == 4
+        assert {dimension: counts(dimension) for dimension in incremental} == incremental
@@ -0,0 +1,31 @@
+from app import create_app
+from app.storage import engine_options
+from config import Config
+from conftest import make_config
+
+
+def config_for(uri, **settings):
+    config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+    config.update(settings, SQLALCHEMY_DATABASE_URI=uri)
+    return config
+
+
+def test_postgres_gets_pool_options():
+    options = engine_options(config_for("postgresql://user:pass@db/reddit", DB_POOL_SIZE=4))
+    assert options == {"pool_size": 4, "max_overflow": 20, "pool_recycle": 1800, "pool_pre_ping": True}
+
+
+def test_sqlite_keeps_defaults():
+    assert engine_options(config_for("sqlite:///reddit.db")) == {}
+
+
+def test_explicit_engine_options_win():
+    options = engine_options(
+        config_for("postgresql://db/reddit", SQLALCHEMY_ENGINE_OPTIONS={"pool_size": 2, "echo": True})
+    )
+    assert options["pool_size"] == 2 and options["echo"] and options["pool_pre_ping"]
+
+
+def test_sqlite_app_gets_no_pool_options(tmp_path):
+    app = create_app(make_config(tmp_path / "test.db"))
+    assert app.config["SQLALCHEMY_ENGINE_OPTIONS"] == {}
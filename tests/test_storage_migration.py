@@ -0,0 +1,93 @@
+import sqlite3
+from sqlalchemy import inspect
+from app import create_app, db
+from app.models.db_models import KeywordData, KeywordPost, PostData
+from config import Config
+
+# Databases created by earlier releases have to boot and come out in the current
+# schema, with every stored post kept and linked to the keywords that fetched it.
+
+BASELINE_SCHEMA = """
+CREATE TABLE keyword_data (
+    id INTEGER NOT NULL PRIMARY KEY,
+    keyword VARCHAR(100) NOT NULL UNIQUE,
+    account_name VARCHAR(100) NOT NULL,
+    industry VARCHAR(100) NOT NULL,
+    timestamp DATETIME NOT NULL
+);
+CREATE TABLE subreddit_data (
+    id INTEGER NOT NULL PRIMARY KEY,
+    subreddit VARCHAR(21) NOT NULL,
+    comment TEXT NOT NULL,
+    created_date DATETIME NOT NULL,
+    author VARCHAR(50) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    keyword_data_id INTEGER NOT NULL REFERENCES keyword_data (id)
+);
+CREATE TABLE praw_log_data (
+    id INTEGER NOT NULL PRIMARY KEY,
+    log VARCHAR(255) NOT NULL,
+    timestamp DATETIME
+);
+"""
+
+
+def make_database(path, reddit_ids=False):
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    if reddit_ids:
+        connection.execute("ALTER TABLE subreddit_data ADD COLUMN reddit_id VARCHAR(16)")
+    connection.executemany(
+        "INSERT INTO keyword_data (id, keyword, account_name, industry, timestamp) VALUES (?, ?, 'acme', 'food', '2024-01-01 00:00:00')",
+        [(1, "pizza"), (2, "coffee")],
+    )
+    return connection
+
+
+def boot(path):
+    class MigrationConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(path)
+
+    return create_app(MigrationConfig)
+
+
+def test_baseline_database_boots_and_keeps_every_post(tmp_path):
+    path = tmp_path / "baseline.db"
+    connection = make_database(path)
+    connection.executemany(
+        "INSERT INTO subreddit_data (id, subreddit, comment, created_date, author, title, keyword_data_id) "
+        "VALUES (?, 'food', 'text', '2024-01-02 10:00:00', 'someone', ?, ?)",
+        [(1, "first", 1), (2, "second", 1), (3, "first", 2)],
+    )
+    connection.commit()
+    connection.close()
+
+    app = boot(path)
+    with app.app_context():
+        assert "subreddit_data" not in inspect(db.engine).get_table_names()
+        posts = {post.id: post for post in PostData.query.all()}
+        assert sorted(posts) == [1, 2, 3]
+        assert all(post.reddit_id is None for post in posts.values())
+        links = {(link.keyword_data_id, link.post_id) for link in KeywordPost.query.all()}
+        assert links == {(1, 1), (1, 2), (2, 3)}
+        assert KeywordData.query.count() == 2
+
+
+def test_posts_with_reddit_ids_are_stored_once(tmp_path):
+    path = tmp_path / "reddit_ids.db"
+    connection = make_database(path, reddit_ids=True)
+    connection.executemany(
+        "INSERT INTO subreddit_data (id, reddit_id, subreddit, comment, created_date, author, title, keyword_data_id) "
+        "VALUES (?, ?, 'food', 'text', '2024-01-02 10:00:00', 'someone', ?, ?)",
+        [(1, "t3_a", "shared, older copy", 1), (2, "t3_a", "shared", 2), (3, "t3_b", "own", 1), (4, None, "no id", 2)],
+    )
+    connection.commit()
+    connection.close()
+
+    app = boot(path)
+    with app.app_context():
+        posts = {post.id: post for post in PostData.query.all()}
+        assert sorted(posts) == [2, 3, 4]
+        assert posts[2].title == "shared"
+        links = {(link.keyword_data_id, link.post_id) for link in KeywordPost.query.all()}
+        assert links == {(1, 2), (2, 2), (1, 3), (2, 4)}
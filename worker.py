@@ -0,0 +1,14 @@
+import argparse
+from app import create_app
+from app.services.scheduler import run_worker
+
+# Background ingestion worker, run alongside the API (python worker.py). The API
+# should be started with INGESTION_MODE=worker so it only reads from the db.
+
+app = create_app()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh keywords from Reddit in the background")
+    parser.add_argument("--once", action="store_true", help="Run a single ingestion cycle and exit")
+    args = parser.parse_args()
+    run_worker(app, once=args.once)